@@ -0,0 +1,88 @@
+"""
+Client for the backend's local inference daemon
+(backend/driver_sentiment_engine/model_server.py).
+
+Vendored so this service does not need the backend package on its path:
+only the ANALYZE call, stdlib only. The wire format is documented in
+backend/driver_sentiment_engine/model_client.py and must stay in step with
+it (backend/tests/test_model_client.py checks this copy against it).
+"""
+import os
+import socket
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+MODEL_SERVER_SOCKET = os.environ.get("MODEL_SERVER_SOCKET",
+                                     "/tmp/sentiment_model.sock")
+
+OP_ANALYZE = 1
+STATUS_ERROR = 1
+MAX_TEXT_CHARS = 512
+
+LABELS = ("NEGATIVE", "POSITIVE")
+
+_LENGTH = struct.Struct(">I")
+_HEADER = struct.Struct(">BH")
+_TEXT_LEN = struct.Struct(">H")
+_RESULT = struct.Struct(">Bf")
+
+
+class ModelServerError(Exception):
+    pass
+
+
+class ModelClient:
+
+    def __init__(self,
+                 socket_path: str = MODEL_SERVER_SOCKET,
+                 timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def _recv_exact(self, size: int) -> bytes:
+        buffer = bytearray()
+        while len(buffer) < size:
+            chunk = self._sock.recv(size - len(buffer))
+            if not chunk:
+                raise ConnectionError("Model server closed the connection")
+            buffer += chunk
+        return bytes(buffer)
+
+    def _call(self, body: bytes) -> bytes:
+        with self._lock:
+            try:
+                if self._sock is None:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.settimeout(self.timeout)
+                    sock.connect(self.socket_path)
+                    self._sock = sock
+                self._sock.sendall(_LENGTH.pack(len(body)) + body)
+                (length, ) = _LENGTH.unpack(self._recv_exact(_LENGTH.size))
+                reply = self._recv_exact(length)
+            except OSError:
+                self.close()
+                raise
+        if reply[0] == STATUS_ERROR:
+            raise ModelServerError(reply[1:].decode("utf-8"))
+        return reply
+
+    def analyze_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        if not texts: return []
+        parts = [_HEADER.pack(OP_ANALYZE, len(texts))]
+        for text in texts:
+            data = text[:MAX_TEXT_CHARS].encode("utf-8")
+            parts.append(_TEXT_LEN.pack(len(data)))
+            parts.append(data)
+        reply = self._call(b"".join(parts))
+        _, count = _HEADER.unpack_from(reply)
+        return [(LABELS[label], confidence)
+                for label, confidence in _RESULT.iter_unpack(
+                    reply[_HEADER.size:_HEADER.size + count * _RESULT.size])]
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
@@ -1,20 +1,35 @@
-from transformers import pipeline
+import os
 
 
 class SentimentEngine:
 
     def __init__(self):
+        # Share the host's model server instead of loading another copy
+        if os.environ.get("MODEL_SERVER_SOCKET"):
+            from model_client import ModelClient
+
+            print("Using shared model server.")
+            self.client = ModelClient()
+            self.pipeline = None
+            return
+
+        from transformers import pipeline
+
         print("Loading Ai Model... please wait.")
 
+        self.client = None
         self.pipeline = pipeline(
             "sentiment-analysis",
             model="distilbert-base-uncased-finetuned-sst-2-english")
 
     def analyze(self, text: str) -> dict:
-        result = self.pipeline(text)[0]
+        if self.client is not None:
+            label, score = self.client.analyze_batch([text])[0]
+        else:
+            result = self.pipeline(text)[0]
 
-        label = result['label']
-        score = result['score']
+            label = result['label']
+            score = result['score']
         is_confident = score > 0.75
 
         return {
@@ -0,0 +1,437 @@
+"""
+Low-score alert pipeline.
+
+Workers only push score events onto a bounded Redis list (the outbox). A
+separate dispatcher drains it in batches, applies hysteresis and cooldown per
+entity and hands the resulting ALERT/CLEAR notifications to the sinks:
+
+    python -m driver_sentiment_engine.alerting
+    python -m driver_sentiment_engine.alerting --stub-webhook 9000
+
+Delivery is at-least-once: events sit in a processing list until the batch's
+state is committed, so a sink may see a duplicate after a crash. When a sink
+fails, the affected entities' events are re-queued addressed to just the sinks
+that missed them; after ALERT_MAX_REQUEUES tries they are given up on and
+moved to alerts:dead for inspection. Run a single dispatcher; per-entity
+alert state is read-modify-written.
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+from redis import Redis
+from . import database, queue
+from .events import publish_admin_event
+
+# Alert Settings
+ALERT_THRESHOLD = float(os.environ.get("ALERT_THRESHOLD", "2.0"))
+# An alerting entity clears only once it recovers to this score
+ALERT_CLEAR_THRESHOLD = float(os.environ.get("ALERT_CLEAR_THRESHOLD", "2.5"))
+# Minimum gap between two alerts for the same entity
+ALERT_COOLDOWN_SECONDS = int(os.environ.get("ALERT_COOLDOWN_SECONDS", "3600"))
+ALERT_OUTBOX_MAXLEN = int(os.environ.get("ALERT_OUTBOX_MAXLEN", "100000"))
+ALERT_BATCH_SIZE = int(os.environ.get("ALERT_BATCH_SIZE", "100"))
+ALERT_DELIVERY_ATTEMPTS = int(os.environ.get("ALERT_DELIVERY_ATTEMPTS", "3"))
+# Times a batch's events are re-queued for a failing sink before giving up
+ALERT_MAX_REQUEUES = int(os.environ.get("ALERT_MAX_REQUEUES", "5"))
+ALERT_SINKS = os.environ.get("ALERT_SINKS", "log,mongo,dashboard")
+ALERT_WEBHOOK_URL = os.environ.get("ALERT_WEBHOOK_URL",
+                                   "http://localhost:9000/alerts")
+
+OUTBOX_KEY = "alerts:outbox"
+# Events the dispatcher has taken but not yet committed
+PROCESSING_KEY = "alerts:processing"
+STATE_KEY = "alerts:state"
+# Events whose alerts some sink never accepted
+DEAD_KEY = "alerts:dead"
+METRICS_KEY = "alerts:metrics"
+
+
+# Outbox (scoring path)
+class AlertOutbox:
+
+    def __init__(self, conn: Redis, maxlen: int = ALERT_OUTBOX_MAXLEN):
+        self.conn = conn
+        self.maxlen = maxlen
+
+    def publish(self, entity_type: str, entity_id: str, score: float):
+        event = json.dumps({
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "score": score,
+            "ts": time.time(),
+        })
+        try:
+            pipe = self.conn.pipeline(transaction=False)
+            pipe.lpush(OUTBOX_KEY, event)
+            pipe.ltrim(OUTBOX_KEY, 0, self.maxlen - 1)
+            length, _ = pipe.execute()
+            # LTRIM dropped the oldest events; newer scores supersede them
+            if length > self.maxlen:
+                self.conn.hincrby(METRICS_KEY, "dropped", length - self.maxlen)
+        except Exception as e:
+            print(f"ERROR: Could not queue alert event for {entity_id}: {e}")
+
+
+def default_outbox() -> Optional[AlertOutbox]:
+    if queue.redis_conn is None: return None
+    return AlertOutbox(queue.redis_conn)
+
+
+# Sinks
+class AlertSink(ABC):
+    # ALERT_SINKS name; re-queued events list the sinks they still owe by it
+    name = ""
+
+    @abstractmethod
+    def deliver(self, alerts: List[Dict[str, Any]]):
+        ...
+
+
+class LogSink(AlertSink):
+    name = "log"
+
+    def deliver(self, alerts: List[Dict[str, Any]]):
+        for alert in alerts:
+            if alert["kind"] == "ALERT":
+                print(
+                    f"!!! ALERT: {alert['entity_type']} {alert['entity_id']} score is low: {alert['score']:.2f} !!!"
+                )
+            else:
+                print(
+                    f"INFO: {alert['entity_type']} {alert['entity_id']} recovered: {alert['score']:.2f}"
+                )
+
+
+class MongoAlertSink(AlertSink):
+    name = "mongo"
+
+    def __init__(self, collection: Any):
+        self.collection = collection
+
+    def deliver(self, alerts: List[Dict[str, Any]]):
+        if self.collection is None: return
+        # insert_many adds _id to the dicts it is given
+        self.collection.insert_many([dict(alert) for alert in alerts])
+
+
+class DashboardSink(AlertSink):
+    name = "dashboard"
+
+    def deliver(self, alerts: List[Dict[str, Any]]):
+        for alert in alerts:
+            publish_admin_event("alert", alert)
+
+
+class WebhookSink(AlertSink):
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, alerts: List[Dict[str, Any]]):
+        body = json.dumps({"alerts": alerts}, default=str).encode()
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def build_sinks(names: str = ALERT_SINKS) -> List[AlertSink]:
+    sinks = []
+    for name in (n.strip() for n in names.split(",")):
+        if name == "log":
+            sinks.append(LogSink())
+        elif name == "mongo":
+            sinks.append(MongoAlertSink(database.alerts_collection))
+        elif name == "dashboard":
+            sinks.append(DashboardSink())
+        elif name == "webhook":
+            sinks.append(WebhookSink(ALERT_WEBHOOK_URL))
+        elif name:
+            print(f"ERROR: Unknown alert sink: {name}")
+    return sinks
+
+
+# Dispatcher
+def _entity_key(item: Dict[str, Any]) -> str:
+    return f"{item['entity_type']}:{item['entity_id']}"
+
+
+def _owed_to(event: Dict[str, Any], sink: AlertSink) -> bool:
+    # Fresh events go to every sink, re-queued ones only to those that missed
+    return event.get("sinks") is None or sink.name in event["sinks"]
+
+
+class AlertDispatcher:
+
+    def __init__(self,
+                 conn: Redis,
+                 sinks: List[AlertSink],
+                 threshold: float = ALERT_THRESHOLD,
+                 clear_threshold: float = ALERT_CLEAR_THRESHOLD,
+                 cooldown_seconds: int = ALERT_COOLDOWN_SECONDS,
+                 batch_size: int = ALERT_BATCH_SIZE,
+                 block_seconds: int = 5,
+                 delivery_attempts: int = ALERT_DELIVERY_ATTEMPTS,
+                 retry_backoff_seconds: float = 0.5,
+                 max_requeues: int = ALERT_MAX_REQUEUES):
+        self.conn = conn
+        self.sinks = sinks
+        self.threshold = threshold
+        self.clear_threshold = max(clear_threshold, threshold)
+        self.cooldown_seconds = cooldown_seconds
+        self.batch_size = batch_size
+        self.block_seconds = block_seconds
+        self.delivery_attempts = max(1, delivery_attempts)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_requeues = max_requeues
+
+    def _read_batch(self, block: bool) -> List[Dict[str, Any]]:
+        # A batch left behind by a dispatcher that died mid-way comes first.
+        # LMOVE pushes on the left, so reverse it back into arrival order.
+        raw = self.conn.lrange(PROCESSING_KEY, 0, -1)[::-1]
+        if raw:
+            return [json.loads(item) for item in raw]
+
+        if block:
+            first = self.conn.blmove(OUTBOX_KEY, PROCESSING_KEY,
+                                     self.block_seconds, "RIGHT", "LEFT")
+            if first is None:
+                return []
+            raw = [first]
+        pipe = self.conn.pipeline(transaction=False)
+        for _ in range(self.batch_size - len(raw)):
+            pipe.lmove(OUTBOX_KEY, PROCESSING_KEY, "RIGHT", "LEFT")
+        raw += [item for item in pipe.execute() if item is not None]
+        return [json.loads(item) for item in raw]
+
+    def _load_states(self,
+                     events: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        fields = list(dict.fromkeys(_entity_key(e) for e in events))
+        return {
+            field: json.loads(raw) if raw else {
+                "alerting": False,
+                "last_alert_at": 0.0
+            }
+            for field, raw in zip(fields, self.conn.hmget(STATE_KEY, fields))
+        }
+
+    def _decide(
+        self, events: List[Dict[str, Any]], states: Dict[str, Dict[str, Any]]
+    ) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any]]], int]:
+        """
+        Walk the events in order, updating `states` in place, and return the
+        ALERT/CLEAR notifications to send, each paired with the event that
+        raised it, plus the number suppressed.
+        """
+        alerts = []
+        suppressed = 0
+        for event in events:
+            state = states[_entity_key(event)]
+            score = event["score"]
+            kind = None
+            if not state["alerting"] and score < self.threshold:
+                if event["ts"] - state["last_alert_at"] < self.cooldown_seconds:
+                    suppressed += 1
+                else:
+                    kind = "ALERT"
+                    state["alerting"] = True
+                    state["last_alert_at"] = event["ts"]
+            elif state["alerting"] and score < self.clear_threshold:
+                suppressed += 1
+            elif state["alerting"]:
+                kind = "CLEAR"
+                state["alerting"] = False
+
+            if kind:
+                alerts.append((event, {
+                    "kind": kind,
+                    "entity_type": event["entity_type"],
+                    "entity_id": event["entity_id"],
+                    "score": score,
+                    "threshold": self.threshold,
+                    "raised_at": datetime.datetime.fromtimestamp(
+                        event["ts"], datetime.UTC),
+                }))
+        return alerts, suppressed
+
+    def _deliver(self, decided: List[Tuple[Dict[str, Any],
+                                           Dict[str, Any]]]) -> Set[str]:
+        """Deliver each alert to the sinks it is owed to, retrying a failing
+        sink with backoff. Returns the names of the sinks that still failed."""
+        failed = set()
+        for sink in self.sinks:
+            alerts = [alert for event, alert in decided if _owed_to(event, sink)]
+            if not alerts:
+                continue
+            for attempt in range(self.delivery_attempts):
+                try:
+                    sink.deliver(alerts)
+                    break
+                except Exception as e:
+                    print(f"ERROR: Alert sink {type(sink).__name__} failed "
+                          f"(attempt {attempt + 1}): {e}")
+                    if attempt + 1 < self.delivery_attempts:
+                        time.sleep(self.retry_backoff_seconds * 2**attempt)
+            else:
+                failed.add(sink.name)
+        return failed
+
+    def dispatch_batch(self, events: List[Dict[str, Any]]):
+        states = self._load_states(events)
+        decided, suppressed = self._decide(events, states)
+        failed = self._deliver(decided) if decided else set()
+
+        # Sinks that missed each alert-raising event, keyed by id(event)
+        missed: Dict[int, List[str]] = {}
+        for event, _ in decided:
+            names = [
+                s.name for s in self.sinks
+                if s.name in failed and _owed_to(event, s)
+            ]
+            if names:
+                missed[id(event)] = names
+        failed_keys = {_entity_key(e) for e in events if id(e) in missed}
+        attempts: Dict[str, int] = {}
+        for event in events:
+            key = _entity_key(event)
+            if key in failed_keys:
+                attempts[key] = max(attempts.get(key, 0),
+                                    event.get("attempts", 0) + 1)
+
+        # An undelivered alert must not be remembered as sent, or later lows
+        # would be suppressed as duplicates. Keep those entities' old state
+        # and put their events back on the outbox; deciding them again from
+        # that state raises the same alerts, sent only to the sinks that
+        # missed them. Entities out of re-queues are given up on instead.
+        requeue, dead = [], []
+        for event in events:
+            key = _entity_key(event)
+            if key not in failed_keys:
+                continue
+            retried = dict(event,
+                           attempts=attempts[key],
+                           sinks=missed.get(id(event), event.get("sinks")))
+            if attempts[key] > self.max_requeues:
+                dead.append(retried)
+            else:
+                requeue.append(retried)
+        for key in {_entity_key(e) for e in dead}:
+            print(f"ERROR: Giving up on alerts for {key} after "
+                  f"{self.max_requeues} re-queues")
+        requeued_keys = {_entity_key(e) for e in requeue}
+        committed = {
+            field: json.dumps(state)
+            for field, state in states.items() if field not in requeued_keys
+        }
+
+        now = time.time()
+        delivered = [
+            alert for _, alert in decided
+            if _entity_key(alert) not in failed_keys
+        ]
+        latencies_ms = [(now - a["raised_at"].timestamp()) * 1000
+                        for a in delivered]
+
+        # State, requeue and releasing the processing list land together
+        pipe = self.conn.pipeline()
+        if committed:
+            pipe.hset(STATE_KEY, mapping=committed)
+        if requeue:
+            # The dispatcher takes from the right, so push oldest-last to
+            # have the re-queued events come out first and in their order
+            pipe.rpush(OUTBOX_KEY, *[json.dumps(e) for e in reversed(requeue)])
+        if dead:
+            pipe.rpush(DEAD_KEY, *[json.dumps(e) for e in dead])
+        pipe.delete(PROCESSING_KEY)
+        pipe.hincrby(METRICS_KEY, "events", len(events))
+        pipe.hincrby(METRICS_KEY, "suppressed", suppressed)
+        pipe.hincrby(METRICS_KEY, "alerts",
+                     sum(1 for a in delivered if a["kind"] == "ALERT"))
+        pipe.hincrby(METRICS_KEY, "clears",
+                     sum(1 for a in delivered if a["kind"] == "CLEAR"))
+        pipe.hincrby(METRICS_KEY, "delivered", len(delivered))
+        pipe.hincrby(METRICS_KEY, "delivery_failures", len(failed))
+        pipe.hincrby(METRICS_KEY, "requeued", len(requeue))
+        pipe.hincrby(METRICS_KEY, "dead_lettered", len(dead))
+        pipe.hincrbyfloat(METRICS_KEY, "latency_ms_total", sum(latencies_ms))
+        pipe.execute()
+        if latencies_ms:
+            current_max = float(self.conn.hget(METRICS_KEY, "latency_ms_max") or 0)
+            if max(latencies_ms) > current_max:
+                self.conn.hset(METRICS_KEY, "latency_ms_max", max(latencies_ms))
+
+    def run(self, burst: bool = False):
+        print(f"Alert dispatcher draining {OUTBOX_KEY} into "
+              f"{[type(s).__name__ for s in self.sinks]}")
+        while True:
+            events = self._read_batch(block=not burst)
+            if events:
+                self.dispatch_batch(events)
+            elif burst:
+                return
+
+
+def get_alert_metrics(conn: Optional[Redis]) -> Dict[str, float]:
+    raw = conn.hgetall(METRICS_KEY) if conn is not None else {}
+    metrics = {key.decode(): float(value) for key, value in raw.items()}
+    delivered = metrics.get("delivered", 0)
+    return {
+        "events": metrics.get("events", 0),
+        "alerts": metrics.get("alerts", 0),
+        "clears": metrics.get("clears", 0),
+        "suppressed": metrics.get("suppressed", 0),
+        "dropped": metrics.get("dropped", 0),
+        "delivery_failures": metrics.get("delivery_failures", 0),
+        "requeued": metrics.get("requeued", 0),
+        "dead_lettered": metrics.get("dead_lettered", 0),
+        "avg_dispatch_latency_ms":
+        metrics.get("latency_ms_total", 0) / delivered if delivered else 0.0,
+        "max_dispatch_latency_ms": metrics.get("latency_ms_max", 0),
+        "outbox_depth": conn.llen(OUTBOX_KEY) if conn is not None else 0,
+    }
+
+
+# Local webhook stub
+class _StubWebhookHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        for alert in json.loads(body).get("alerts", []):
+            print(f"WEBHOOK STUB: {alert}")
+        self.send_response(204)
+        self.end_headers()
+
+
+def run_stub_webhook(port: int):
+    print(f"Webhook stub listening on http://localhost:{port}/alerts")
+    HTTPServer(("localhost", port), _StubWebhookHandler).serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Alert dispatcher")
+    parser.add_argument("--stub-webhook",
+                        type=int,
+                        metavar="PORT",
+                        help="Run the local webhook stub instead")
+    args = parser.parse_args()
+
+    if args.stub_webhook:
+        run_stub_webhook(args.stub_webhook)
+    else:
+        try:
+            redis_conn = Redis.from_url(queue.REDIS_CONN_STR)
+            AlertDispatcher(redis_conn, build_sinks()).run()
+
+        except Exception as e:
+            print(f"CRITICAL: Alert dispatcher failed to start. Redis error: {e}")
@@ -0,0 +1,364 @@
+"""
+Re-score historical trip feedback and rebuild driver/marshal stats.
+
+    python -m driver_sentiment_engine.backfill --job rescore-v2 --workers 4
+
+Feedback is streamed from Mongo in (created_at, _id) order and scored in a
+process pool. New scores go to a shadow score_rebuild field and the EMA is
+replayed per entity in chronological order into shadow stats collections.
+Both are swapped in for trip_feedback.score and driver_stats/marshal_stats
+in the same step once the run completes, so scores and stats never come
+from different models. Progress is checkpointed, so re-running the same
+--job resumes where it stopped. Use --restart to start over.
+
+Stop the feedback workers before the swap: live stats updates made during
+a run are overwritten by the rebuilt collections.
+"""
+import argparse
+import datetime
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pymongo import UpdateOne
+from . import database, leaderboard, queue
+from .models import EntityType
+from .services import RuleBasedAnalyzer, build_sentiment_analyzer
+
+# Scored entity type -> (live stats collection name, id field)
+STATS_TARGETS = {
+    EntityType.DRIVER.value: ("driver_stats", "driver_id"),
+    EntityType.MARSHAL.value: ("marshal_stats", "marshal_id"),
+}
+SHADOW_SUFFIX = "_rebuild"
+# trip_feedback field holding re-scored values until the swap
+SHADOW_SCORE_FIELD = "score_rebuild"
+
+# Checkpoint phases, in order. Once past REPLAYING the shadows are complete
+# and must never be re-created or replayed into again.
+PHASE_REPLAYING = "replaying"
+PHASE_REPLAYED = "replayed"
+PHASE_SWAPPING = "swapping"
+PHASE_DONE = "done"
+
+# Set in each pool process by _init_worker
+_worker_analyzer = None
+
+
+def _init_worker(analyzer_kind: str):
+    global _worker_analyzer
+    if analyzer_kind == "ai":
+        _worker_analyzer = build_sentiment_analyzer()
+    else:
+        _worker_analyzer = RuleBasedAnalyzer()
+
+
+def _score_batch(texts: List[str]) -> List[float]:
+    return _worker_analyzer.analyze_batch(texts)
+
+
+def _chunks(cursor: Any, size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _position(doc: Dict[str, Any]) -> Tuple[datetime.datetime, Any]:
+    return (doc["created_at"], doc["_id"])
+
+
+def fold_feedback(row: Dict[str, Any], doc: Dict[str, Any],
+                  score: float) -> bool:
+    """
+    Apply one feedback score to an entity's EMA row. Returns False when the
+    row already includes this feedback (replayed before an interrupted
+    run's last checkpoint), so resuming never counts a document twice.
+    """
+    if row.get("last_created_at") is not None and _position(doc) <= (
+            row["last_created_at"], row["last_feedback_id"]):
+        return False
+    row["average_score"] = database.next_ema(row["average_score"], score)
+    row["feedback_count"] += 1
+    row["last_created_at"], row["last_feedback_id"] = _position(doc)
+    return True
+
+
+class Backfill:
+
+    def __init__(self, job_name: str, batch_size: int, workers: int,
+                 checkpoint_every: int, analyzer_kind: str):
+        self.job_name = job_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.checkpoint_every = checkpoint_every
+        self.analyzer_kind = analyzer_kind
+        self.shadows = {
+            entity_type: (database.db[name + SHADOW_SUFFIX], id_field)
+            for entity_type, (name, id_field) in STATS_TARGETS.items()
+        }
+        # EMA state for entities touched since the last flush only, so
+        # memory stays bounded by batch traffic rather than fleet size.
+        self.state: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.processed = 0
+        self.resumed_from = 0
+        self.since_checkpoint = 0
+        self.started_at = time.time()
+
+    # Checkpoints
+    def load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        return database.backfill_checkpoints_collection.find_one(
+            {"job": self.job_name})
+
+    def save_checkpoint(self, last_doc: Dict[str, Any]):
+        database.backfill_checkpoints_collection.update_one(
+            {"job": self.job_name}, {
+                "$set": {
+                    "last_created_at": last_doc["created_at"],
+                    "last_id": last_doc["_id"],
+                    "processed": self.processed,
+                    "phase": PHASE_REPLAYING,
+                    "updated_at": datetime.datetime.now(datetime.UTC),
+                }
+            },
+            upsert=True)
+
+    def set_phase(self, phase: str):
+        database.backfill_checkpoints_collection.update_one(
+            {"job": self.job_name}, {
+                "$set": {
+                    "phase": phase,
+                    "processed": self.processed,
+                    "updated_at": datetime.datetime.now(datetime.UTC),
+                }
+            },
+            upsert=True)
+
+    def reset(self):
+        database.backfill_checkpoints_collection.delete_one(
+            {"job": self.job_name})
+        for shadow, _ in self.shadows.values():
+            shadow.drop()
+        database.trip_feedback_collection.update_many(
+            {SHADOW_SCORE_FIELD: {
+                "$exists": True
+            }}, {"$unset": {
+                SHADOW_SCORE_FIELD: ""
+            }})
+
+    # EMA replay
+    def _load_state(self, docs: List[Dict[str, Any]]):
+        missing: Dict[str, set] = {}
+        for doc in docs:
+            key = (doc["entity_type"], doc["entity_id"])
+            if doc["entity_type"] in self.shadows and key not in self.state:
+                missing.setdefault(doc["entity_type"], set()).add(doc["entity_id"])
+
+        for entity_type, entity_ids in missing.items():
+            shadow, id_field = self.shadows[entity_type]
+            for row in shadow.find({id_field: {"$in": list(entity_ids)}}):
+                self.state[(entity_type, row[id_field])] = row
+            for entity_id in entity_ids:
+                self.state.setdefault((entity_type, entity_id), {
+                    id_field: entity_id,
+                    "average_score": None,
+                    "feedback_count": 0,
+                })
+
+    def _replay(self, doc: Dict[str, Any], score: float):
+        fold_feedback(self.state[(doc["entity_type"], doc["entity_id"])], doc,
+                      score)
+
+    def flush_state(self):
+        for entity_type, (shadow, id_field) in self.shadows.items():
+            ops = [
+                UpdateOne({id_field: row[id_field]}, {
+                    "$set": {
+                        "average_score": row["average_score"],
+                        "feedback_count": row["feedback_count"],
+                        "last_created_at": row["last_created_at"],
+                        "last_feedback_id": row["last_feedback_id"],
+                    }
+                },
+                          upsert=True)
+                for (row_type, _), row in self.state.items()
+                if row_type == entity_type and row["feedback_count"]
+            ]
+            if ops:
+                shadow.bulk_write(ops, ordered=False)
+        self.state.clear()
+
+    def apply(self, docs: List[Dict[str, Any]], scores: List[float]):
+        self._load_state(docs)
+        feedback_ops = []
+        for doc, score in zip(docs, scores):
+            feedback_ops.append(
+                UpdateOne({"_id": doc["_id"]},
+                          {"$set": {
+                              SHADOW_SCORE_FIELD: score
+                          }}))
+            if doc["entity_type"] in self.shadows:
+                self._replay(doc, score)
+        database.trip_feedback_collection.bulk_write(feedback_ops,
+                                                     ordered=False)
+
+        self.processed += len(docs)
+        self.since_checkpoint += len(docs)
+        if self.since_checkpoint >= self.checkpoint_every:
+            self.flush_state()
+            self.save_checkpoint(docs[-1])
+            self.since_checkpoint = 0
+            self.report()
+
+    def report(self):
+        elapsed = time.time() - self.started_at
+        done_now = self.processed - self.resumed_from
+        print(f"BACKFILL: {self.processed} docs total, {done_now} in "
+              f"{elapsed:.1f}s ({done_now / max(elapsed, 1e-9):.1f} docs/sec)")
+
+    def swap_in(self):
+        # Recorded before the first rename, so a resumed run never rebuilds
+        # an empty shadow and renames it over already swapped-in stats.
+        self.set_phase(PHASE_SWAPPING)
+        existing = database.db.list_collection_names()
+        for entity_type, (shadow, id_field) in self.shadows.items():
+            live_name = STATS_TARGETS[entity_type][0]
+            # Already swapped by an earlier, interrupted run
+            if shadow.name not in existing:
+                continue
+            shadow.update_many({}, {
+                "$unset": {
+                    "last_created_at": "",
+                    "last_feedback_id": ""
+                }
+            })
+            shadow.create_index(id_field, unique=True)
+            shadow.rename(live_name, dropTarget=True)
+            print(f"BACKFILL: Replaced {live_name} with rebuilt stats.")
+
+        # Only documents not yet promoted still carry the shadow field, so
+        # a resumed swap picks up where it stopped
+        result = database.trip_feedback_collection.update_many(
+            {SHADOW_SCORE_FIELD: {
+                "$exists": True
+            }}, [{
+                "$set": {
+                    "score": f"${SHADOW_SCORE_FIELD}"
+                }
+            }, {
+                "$unset": SHADOW_SCORE_FIELD
+            }])
+        print(f"BACKFILL: Promoted {result.modified_count} re-scored "
+              f"trip_feedback scores.")
+
+        if queue.redis_conn is not None:
+            leaderboard.rebuild("driver", database.driver_stats_collection)
+            leaderboard.rebuild("marshal", database.marshal_stats_collection)
+        self.set_phase(PHASE_DONE)
+
+    def run(self, restart: bool = False, swap: bool = True):
+        if restart:
+            self.reset()
+
+        checkpoint = self.load_checkpoint() or {}
+        phase = checkpoint.get("phase", PHASE_REPLAYING)
+        self.processed = checkpoint.get("processed", 0)
+        if phase == PHASE_DONE:
+            print(f"BACKFILL: Job {self.job_name} already finished.")
+            return
+        if phase == PHASE_REPLAYING:
+            self.replay(checkpoint)
+            self.set_phase(PHASE_REPLAYED)
+        else:
+            print(f"BACKFILL: Job {self.job_name} already replayed "
+                  f"({phase}); skipping to the swap.")
+
+        if swap:
+            self.swap_in()
+        else:
+            print("BACKFILL: Rebuilt stats left in *_rebuild collections "
+                  f"and scores in trip_feedback.{SHADOW_SCORE_FIELD}.")
+
+    def replay(self, checkpoint: Dict[str, Any]):
+        for shadow, id_field in self.shadows.values():
+            shadow.create_index(id_field, unique=True)
+
+        query: Dict[str, Any] = {"feedback_text": {"$type": "string"}}
+        if "last_id" in checkpoint:
+            self.resumed_from = self.processed
+            query["$or"] = [
+                {"created_at": {"$gt": checkpoint["last_created_at"]}},
+                {
+                    "created_at": checkpoint["last_created_at"],
+                    "_id": {"$gt": checkpoint["last_id"]}
+                },
+            ]
+            print(f"BACKFILL: Resuming {self.job_name} after "
+                  f"{self.processed} docs.")
+
+        cursor = database.trip_feedback_collection.find(
+            query, {
+                "entity_type": 1,
+                "entity_id": 1,
+                "feedback_text": 1,
+                "created_at": 1
+            },
+            no_cursor_timeout=True).sort([("created_at", 1), ("_id", 1)
+                                          ]).batch_size(self.batch_size)
+
+        # Scoring runs ahead in the pool, but results are applied strictly
+        # in cursor order and only a few batches are kept in flight.
+        pending: deque[Tuple[List[Dict[str, Any]], Future]] = deque()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     initializer=_init_worker,
+                                     initargs=(self.analyzer_kind, )) as pool:
+                for docs in _chunks(cursor, self.batch_size):
+                    texts = [doc["feedback_text"] for doc in docs]
+                    pending.append((docs, pool.submit(_score_batch, texts)))
+                    if len(pending) >= self.workers * 2:
+                        docs, future = pending.popleft()
+                        self.apply(docs, future.result())
+                while pending:
+                    docs, future = pending.popleft()
+                    self.apply(docs, future.result())
+        finally:
+            cursor.close()
+
+        self.flush_state()
+        self.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--job", required=True, help="Checkpoint name")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--checkpoint-every", type=int, default=10000)
+    parser.add_argument("--analyzer", choices=["ai", "rule"], default="ai")
+    parser.add_argument("--restart",
+                        action="store_true",
+                        help="Discard the checkpoint and shadow collections")
+    parser.add_argument("--no-swap",
+                        action="store_true",
+                        help="Leave the rebuilt stats and scores in shadows")
+    args = parser.parse_args()
+
+    if database.db is None:
+        print("CRITICAL: Backfill needs MongoDB.")
+        return
+
+    Backfill(job_name=args.job,
+             batch_size=args.batch_size,
+             workers=args.workers,
+             checkpoint_every=args.checkpoint_every,
+             analyzer_kind=args.analyzer).run(restart=args.restart,
+                                              swap=not args.no_swap)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare the shared model server with in-process inference.
+
+    python -m driver_sentiment_engine.model_server &
+    python -m driver_sentiment_engine.bench_model_server --requests 500 --processes 4
+
+Reports per-request latency both ways (the difference is the IPC overhead),
+the RSS of a client process, of the server and of an in-process analyzer,
+and the resulting per-host RSS for --processes model users.
+"""
+import argparse
+import time
+from typing import Callable, List
+from .model_client import ModelClient, current_rss_bytes
+
+MB = 1024 * 1024
+
+SAMPLE_TEXTS = [
+    "Driver was great and very helpful",
+    "Terrible ride, the driver was rude",
+    "Okay trip, nothing special to report here",
+    "Fast pickup, clean car, best ride this week",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def time_requests(call: Callable[[List[str]], object], requests: int,
+                  batch: int) -> List[float]:
+    latencies = []
+    for i in range(requests):
+        texts = [
+            SAMPLE_TEXTS[(i + j) % len(SAMPLE_TEXTS)] for j in range(batch)
+        ]
+        start = time.perf_counter()
+        call(texts)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def describe(name: str, latencies: List[float]) -> str:
+    return (f"{name:>10}: p50={percentile(latencies, 50) * 1000:.2f}ms "
+            f"p95={percentile(latencies, 95) * 1000:.2f}ms "
+            f"p99={percentile(latencies, 99) * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--processes",
+                        type=int,
+                        default=3,
+                        help="Model users per host (workers + ai_services)")
+    args = parser.parse_args()
+
+    # Measured before transformers is imported in this process
+    client_rss = current_rss_bytes()
+    client = ModelClient()
+    client.analyze_batch(SAMPLE_TEXTS)
+    remote = time_requests(client.analyze_batch, args.requests, args.batch)
+    server_rss = client.stats()["rss_bytes"]
+
+    from transformers import pipeline
+    local_pipeline = pipeline(
+        "sentiment-analysis",
+        model="distilbert-base-uncased-finetuned-sst-2-english",
+        device=-1)
+    local_pipeline(SAMPLE_TEXTS)
+    local = time_requests(local_pipeline, args.requests, args.batch)
+    in_process_rss = current_rss_bytes()
+
+    print(describe("in-process", local))
+    print(describe("server", remote))
+    print(f"IPC overhead: p50 "
+          f"{(percentile(remote, 50) - percentile(local, 50)) * 1000:.2f}ms "
+          f"per request of {args.batch} text(s)")
+    print(f"RSS: client {client_rss / MB:.0f}MB, server {server_rss / MB:.0f}MB, "
+          f"in-process analyzer {in_process_rss / MB:.0f}MB")
+    print(f"Per host with {args.processes} model users: "
+          f"in-process {args.processes * in_process_rss / MB:.0f}MB vs "
+          f"shared {(server_rss + args.processes * client_rss) / MB:.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
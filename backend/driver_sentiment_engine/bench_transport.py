@@ -0,0 +1,158 @@
+"""
+Benchmark the RQ and Redis Streams feedback transports end to end.
+
+    python -m driver_sentiment_engine.bench_transport --jobs 2000
+    python -m driver_sentiment_engine.bench_transport --transport stream --ai
+
+Both transports publish the same synthetic DRIVER feedback, drain it with a
+single local consumer and report jobs/sec plus publish-to-done latency
+percentiles. Live data is never touched: the run writes to its own Mongo
+database, Redis db and admin events channel, and drops the database and
+flushes that Redis db when it finishes.
+"""
+import argparse
+import os
+import time
+from typing import List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+BENCH_MONGO_DB = "sentiment_bench"
+BENCH_REDIS_DB = 15
+BENCH_ADMIN_CHANNEL = "bench:admin:events"
+
+# The package connects when imported, so redirect it to the bench stores first
+LIVE_MONGO_DB = os.environ.get("MONGO_DB_NAME", "sentiment_db")
+LIVE_REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+os.environ["MONGO_DB_NAME"] = BENCH_MONGO_DB
+os.environ["REDIS_URL"] = urlunsplit(
+    urlsplit(LIVE_REDIS_URL)._replace(path=f"/{BENCH_REDIS_DB}"))
+os.environ["ADMIN_EVENTS_CHANNEL"] = BENCH_ADMIN_CHANNEL
+
+from redis import Redis  # noqa: E402
+from rq import Queue, Worker  # noqa: E402
+from rq.job import Job  # noqa: E402
+from . import database, models  # noqa: E402
+from .queue import REDIS_CONN_STR, RedisStreamTransport  # noqa: E402
+from .services import (FeedbackProcessor, RuleBasedAnalyzer,  # noqa: E402
+                       AlertingService, build_sentiment_analyzer)
+from .stream_worker import StreamConsumer  # noqa: E402
+
+BENCH_QUEUE = "feedback_bench"
+BENCH_STREAM = "feedback_bench_stream"
+BENCH_GROUP = "feedback_bench_workers"
+
+# Set in main(); RQ work-horses inherit it when they fork
+processor: Optional[FeedbackProcessor] = None
+
+SAMPLE_TEXTS = [
+    "Driver was great and very helpful",
+    "Terrible ride, the driver was rude",
+    "Okay trip, nothing special to report here",
+    "Fast pickup, clean car, best ride this week",
+]
+
+
+def run_bench_job(submission: models.GenericFeedbackSubmission):
+    processor.process_feedback(submission)
+
+
+def make_submissions(count: int) -> List[models.GenericFeedbackSubmission]:
+    return [
+        models.GenericFeedbackSubmission(
+            user_id="bench-user",
+            entity_type=models.EntityType.DRIVER,
+            entity_id=f"bench-driver-{i % 100}",
+            feedback_text=SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+        for i in range(count)
+    ]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values: return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name: str, count: int, elapsed: float, latencies: List[float]):
+    print(f"{name:>8}: {count} jobs in {elapsed:.2f}s "
+          f"-> {count / elapsed:.1f} jobs/sec | latency "
+          f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p95={percentile(latencies, 95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+
+def bench_rq(conn: Redis, submissions: List[models.GenericFeedbackSubmission]):
+    queue = Queue(BENCH_QUEUE, connection=conn)
+    queue.empty()
+
+    start = time.time()
+    jobs = [queue.enqueue(run_bench_job, submission) for submission in submissions]
+    Worker([queue], connection=conn).work(burst=True)
+    elapsed = time.time() - start
+
+    latencies = [(job.ended_at - job.enqueued_at).total_seconds()
+                 for job in Job.fetch_many([job.id for job in jobs],
+                                           connection=conn)
+                 if job and job.ended_at and job.enqueued_at]
+    report("rq", len(submissions), elapsed, latencies)
+
+
+def bench_stream(conn: Redis, submissions: List[models.GenericFeedbackSubmission],
+                 batch_size: int):
+    conn.delete(BENCH_STREAM)
+    transport = RedisStreamTransport(conn, stream=BENCH_STREAM)
+    consumer = StreamConsumer(conn,
+                              processor,
+                              stream=BENCH_STREAM,
+                              group=BENCH_GROUP,
+                              batch_size=batch_size,
+                              track_latency=True)
+
+    start = time.time()
+    for submission in submissions:
+        transport.publish(submission)
+    consumer.run(burst=True)
+    elapsed = time.time() - start
+
+    report("stream", len(submissions), elapsed, consumer.latencies)
+    conn.delete(BENCH_STREAM)
+
+
+def main():
+    global processor
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--transport",
+                        choices=["rq", "stream", "both"],
+                        default="both")
+    parser.add_argument("--ai",
+                        action="store_true",
+                        help="Score with DistilBERT instead of the rule-based analyzer")
+    args = parser.parse_args()
+
+    if (LIVE_MONGO_DB == BENCH_MONGO_DB
+            or urlsplit(LIVE_REDIS_URL).path.strip("/") == str(BENCH_REDIS_DB)):
+        print(f"CRITICAL: Live data uses the bench Mongo database or Redis "
+              f"db ({BENCH_MONGO_DB}, {BENCH_REDIS_DB}); refusing to run.")
+        return
+
+    analyzer = build_sentiment_analyzer() if args.ai else RuleBasedAnalyzer()
+    processor = FeedbackProcessor(analyzer=analyzer, alerter=AlertingService())
+    conn = Redis.from_url(REDIS_CONN_STR)
+    submissions = make_submissions(args.jobs)
+
+    try:
+        if args.transport in ("rq", "both"):
+            bench_rq(conn, submissions)
+        if args.transport in ("stream", "both"):
+            bench_stream(conn, submissions, args.batch_size)
+    finally:
+        conn.flushdb()
+        if database.client is not None:
+            database.client.drop_database(BENCH_MONGO_DB)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,20 @@
 import os
 import datetime
-from pymongo import MongoClient, UpdateOne, errors
+from pymongo import MongoClient, ReturnDocument, UpdateOne, errors
 from pymongo.errors import ConnectionFailure, DuplicateKeyError
 from typing import Optional, Any, Dict, List
 from .models import UiConfig
 from .auth import UserInDB
+from . import leaderboard
 
 #  Database Connection
 try:
     MONGO_CONN_STR = os.environ.get("MONGO_CONN_STR",
                                     "mongodb://localhost:27017/")
+    MONGO_DB_NAME = os.environ.get("MONGO_DB_NAME", "sentiment_db")
     client = MongoClient(MONGO_CONN_STR)
     client.admin.command('ping')
-    db = client.sentiment_db
+    db = client[MONGO_DB_NAME]
     driver_stats_collection = db.driver_stats
     processed_trips_collection = db.processed_trips
     users_collection = db.users
@@ -20,11 +22,14 @@ try:
     marshal_stats_collection = db.marshal_stats
     trip_feedback_collection = db.trip_feedback
     app_feedback_collection = db.app_feedback
+    backfill_checkpoints_collection = db.backfill_checkpoints
+    alerts_collection = db.alerts
 
     processed_trips_collection.create_index("trip_id", unique=True)
     users_collection.create_index("username", unique=True)
     driver_stats_collection.create_index("driver_id", unique=True)
     marshal_stats_collection.create_index("marshal_id", unique=True)
+    trip_feedback_collection.create_index([("created_at", 1), ("_id", 1)])
 
     print("Connected to MongoDB successfully!")
 except ConnectionFailure as e:
@@ -38,11 +43,18 @@ except ConnectionFailure as e:
     marshal_stats_collection = None
     trip_feedback_collection = None
     app_feedback_collection = None
+    backfill_checkpoints_collection = None
+    alerts_collection = None
 
 # EMA Settings
 EMA_ALPHA = 0.1
 
 
+def next_ema(old_avg: Optional[float], new_score: float) -> float:
+    if old_avg is None: return new_score
+    return (EMA_ALPHA * new_score) + ((1 - EMA_ALPHA) * old_avg)
+
+
 #  Idempotency
 def check_and_mark_trip(trip_id: str) -> bool:
     if not trip_id: return True
@@ -64,31 +76,54 @@ def check_and_mark_trip(trip_id: str) -> bool:
         return True
 
 
+def unmark_trip(trip_id: str):
+    """Release a trip marked by check_and_mark_trip so it can be retried."""
+    if not trip_id: return
+    if processed_trips_collection is None: return
+    try:
+        processed_trips_collection.delete_one({'trip_id': trip_id})
+        print(f"IDEMPOTENCY: Released trip {trip_id} for retry.")
+    except Exception as e:
+        print(f"ERROR: Could not release trip_id {trip_id}: {e}")
+
+
 # Generic Stats Updaters
 def _update_scored_entity_stats(collection: Any, entity_id_field: str,
                                 entity_id: str,
-                                new_score: float) -> Optional[float]:
+                                new_score: float) -> Optional[Dict[str, Any]]:
     if collection is None: return None
-    doc = collection.find_one({entity_id_field: entity_id})
-    if doc:
-        old_avg = doc['average_score']
-        new_avg = (EMA_ALPHA * new_score) + ((1 - EMA_ALPHA) * old_avg)
-        new_count = doc['feedback_count'] + 1
-        collection.update_one(
-            {entity_id_field: entity_id},
-            {'$set': {
-                'average_score': new_avg,
-                'feedback_count': new_count
-            }})
-    else:
-        new_avg = new_score
-        new_count = 1
-        collection.insert_one({
-            entity_id_field: entity_id,
-            'average_score': new_avg,
-            'feedback_count': new_count
-        })
-    return new_avg
+    # One atomic read-modify-write, so consumers updating the same entity
+    # side by side never lose an update. Same arithmetic as next_ema(); a
+    # missing average (new entity) makes the EMA null and falls back to
+    # the score itself.
+    ema = {
+        '$add': [
+            EMA_ALPHA * new_score, {
+                '$multiply': [1 - EMA_ALPHA, '$average_score']
+            }
+        ]
+    }
+    doc = collection.find_one_and_update(
+        {entity_id_field: entity_id}, [{
+            '$set': {
+                'average_score': {
+                    '$ifNull': [ema, new_score]
+                },
+                'feedback_count': {
+                    '$add': [{
+                        '$ifNull': ['$feedback_count', 0]
+                    }, 1]
+                },
+            }
+        }],
+        projection={'_id': 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER)
+
+    kind = leaderboard.kind_for_id_field(entity_id_field)
+    if kind:
+        leaderboard.record_score(kind, entity_id, doc['average_score'])
+    return doc
 
 
 # Specific Stats Functions
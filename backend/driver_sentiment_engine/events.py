@@ -0,0 +1,108 @@
+import datetime
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.client import PubSub
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from . import queue
+
+# Admin live feed (Redis pub/sub -> SSE)
+ADMIN_EVENTS_CHANNEL = os.environ.get("ADMIN_EVENTS_CHANNEL", "admin:events")
+SSE_HEARTBEAT_SECONDS = 15.0
+
+# One pool shared by every SSE stream of the API process (see open_admin_events)
+_async_conn: Optional[AsyncRedis] = None
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def publish_admin_event(kind: str, data: Dict[str, Any]):
+    if queue.redis_conn is None: return
+    payload = {
+        key: value
+        for key, value in data.items() if key != "_id"
+    }
+    try:
+        queue.redis_conn.publish(
+            ADMIN_EVENTS_CHANNEL,
+            json.dumps({
+                "kind": kind,
+                "data": payload
+            }, default=_json_default))
+    except Exception as e:
+        print(f"ERROR: Could not publish admin event {kind}: {e}")
+
+
+def open_admin_events():
+    global _async_conn
+    _async_conn = AsyncRedis.from_url(queue.REDIS_CONN_STR)
+
+
+async def close_admin_events():
+    global _async_conn
+    if _async_conn is not None:
+        await _async_conn.aclose()
+        _async_conn = None
+
+
+async def subscribe_admin_events() -> PubSub:
+    """
+    Subscribe before the SSE response starts, so once a client sees the
+    response it can load a snapshot knowing no later delta will be missed.
+    Release it with close_admin_subscription.
+    """
+    pubsub = _async_conn.pubsub()
+    try:
+        await pubsub.subscribe(ADMIN_EVENTS_CHANNEL)
+        # Wait for Redis to confirm the subscription
+        await pubsub.get_message(timeout=SSE_HEARTBEAT_SECONDS)
+    except Exception:
+        await pubsub.aclose()
+        raise
+    return pubsub
+
+
+async def close_admin_subscription(pubsub: PubSub):
+    # Hands the connection back to the shared pool
+    try:
+        await pubsub.unsubscribe(ADMIN_EVENTS_CHANNEL)
+    except Exception as e:
+        print(f"ERROR: Could not unsubscribe from admin events: {e}")
+    await pubsub.aclose()
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    SSE response whose background task runs however the response ends.
+    Starlette skips it when the client is gone before or while the body is
+    sent, which would leak a pub/sub connection per dropped client.
+    """
+    media_type = "text/event-stream"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        background, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if background is not None:
+                await background()
+
+
+async def admin_event_stream(
+        pubsub: PubSub,
+        is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[str]:
+    yield "retry: 3000\n\n"
+    while not await is_disconnected():
+        message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                           timeout=SSE_HEARTBEAT_SECONDS)
+        if message is None:
+            # Comment line keeps proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+            continue
+        yield f"data: {message['data'].decode()}\n\n"
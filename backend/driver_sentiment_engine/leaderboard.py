@@ -0,0 +1,232 @@
+"""
+Redis indexes over driver/marshal average scores.
+
+Per entity kind a sorted set (member = entity id, score = average_score) and a
+hash of histogram bucket counts are kept current by the stats updater, so
+leaderboards and ranks never need a collection scan. Seed or repair them with:
+
+    python -m driver_sentiment_engine.leaderboard --rebuild
+
+Workers may keep running during a rebuild: entities they update while Mongo is
+being scanned are recorded and re-read from Mongo after the swap.
+"""
+import argparse
+from typing import Any, Dict, List, Optional
+from . import queue
+
+# Entity kind -> stats id field
+KINDS = {"driver": "driver_id", "marshal": "marshal_id"}
+
+SCORE_MIN = 1.0
+SCORE_MAX = 5.0
+BUCKET_WIDTH = 0.5
+BUCKET_COUNT = int((SCORE_MAX - SCORE_MIN) / BUCKET_WIDTH)
+# How long a crashed rebuild keeps workers recording dirty ids
+REBUILD_FLAG_TTL_SECONDS = 3600
+
+# Moves the entity between histogram buckets based on its previous score in
+# the sorted set itself, so the two can never disagree (or go negative) even
+# for entities that were never seeded. While a rebuild is running, the id is
+# also remembered so the rebuild can re-apply it after its swap.
+# KEYS: zset, hist, rebuilding flag, dirty set
+# ARGV: entity id, score, SCORE_MIN, BUCKET_WIDTH, BUCKET_COUNT
+_RECORD_SCORE_LUA = """
+local function bucket(score)
+  local b = math.floor((tonumber(score) - tonumber(ARGV[3])) / tonumber(ARGV[4]))
+  return math.max(0, math.min(tonumber(ARGV[5]) - 1, b))
+end
+local old = redis.call('ZSCORE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+local new_bucket = bucket(ARGV[2])
+if not old then
+  redis.call('HINCRBY', KEYS[2], new_bucket, 1)
+elseif bucket(old) ~= new_bucket then
+  redis.call('HINCRBY', KEYS[2], bucket(old), -1)
+  redis.call('HINCRBY', KEYS[2], new_bucket, 1)
+end
+if redis.call('EXISTS', KEYS[3]) == 1 then
+  redis.call('SADD', KEYS[4], ARGV[1])
+end
+"""
+_record_script = None
+
+
+def _zset_key(kind: str) -> str:
+    return f"leaderboard:{kind}"
+
+
+def _hist_key(kind: str) -> str:
+    return f"score_hist:{kind}"
+
+
+def _rebuilding_key(kind: str) -> str:
+    return f"leaderboard:{kind}:rebuilding"
+
+
+def _dirty_key(kind: str) -> str:
+    return f"leaderboard:{kind}:dirty"
+
+
+def bucket_for(score: float) -> int:
+    index = int((score - SCORE_MIN) / BUCKET_WIDTH)
+    return max(0, min(BUCKET_COUNT - 1, index))
+
+
+def kind_for_id_field(entity_id_field: str) -> Optional[str]:
+    for kind, id_field in KINDS.items():
+        if id_field == entity_id_field:
+            return kind
+    return None
+
+
+# Index maintenance (worker path)
+def record_score(kind: str, entity_id: str, new_avg: float):
+    global _record_script
+    if queue.redis_conn is None: return
+    try:
+        if _record_script is None:
+            _record_script = queue.redis_conn.register_script(
+                _RECORD_SCORE_LUA)
+        _record_script(keys=[
+            _zset_key(kind),
+            _hist_key(kind),
+            _rebuilding_key(kind),
+            _dirty_key(kind)
+        ],
+                       args=[
+                           entity_id, new_avg, SCORE_MIN, BUCKET_WIDTH,
+                           BUCKET_COUNT
+                       ])
+    except Exception as e:
+        print(f"ERROR: Could not update leaderboard for {kind} {entity_id}: {e}")
+
+
+def rebuild(kind: str, collection: Any) -> int:
+    id_field = KINDS[kind]
+    zset_key = _zset_key(kind)
+    tmp_key = f"{zset_key}:rebuild"
+    conn = queue.redis_conn
+
+    conn.delete(tmp_key, _dirty_key(kind))
+    conn.set(_rebuilding_key(kind), 1, ex=REBUILD_FLAG_TTL_SECONDS)
+    counts = [0] * BUCKET_COUNT
+    total = 0
+    pipe = conn.pipeline(transaction=False)
+    for doc in collection.find({}, {
+            id_field: 1,
+            'average_score': 1,
+            '_id': 0
+    }).batch_size(5000):
+        pipe.zadd(tmp_key, {doc[id_field]: doc['average_score']})
+        counts[bucket_for(doc['average_score'])] += 1
+        total += 1
+        if total % 1000 == 0:
+            pipe.execute()
+    pipe.execute()
+
+    # Swap both indexes in one MULTI so readers never see a half-built one
+    swap = conn.pipeline()
+    if total:
+        swap.rename(tmp_key, zset_key)
+    else:
+        swap.delete(zset_key)
+    swap.delete(_hist_key(kind))
+    swap.hset(_hist_key(kind),
+              mapping={index: count
+                       for index, count in enumerate(counts)})
+    swap.delete(_rebuilding_key(kind))
+    swap.smembers(_dirty_key(kind))
+    swap.delete(_dirty_key(kind))
+    dirty = swap.execute()[-2]
+
+    # The scan may have read these before a worker updated them; re-read
+    # the current value now that updates go to the live index again.
+    dirty_ids = [entity_id.decode() for entity_id in dirty]
+    for start in range(0, len(dirty_ids), 1000):
+        for doc in collection.find(
+            {id_field: {
+                '$in': dirty_ids[start:start + 1000]
+            }}, {
+                id_field: 1,
+                'average_score': 1,
+                '_id': 0
+            }):
+            record_score(kind, doc[id_field], doc['average_score'])
+
+    print(f"LEADERBOARD: Rebuilt {kind} index with {total} entries "
+          f"({len(dirty_ids)} updated during the scan re-applied).")
+    return total
+
+
+# Queries
+def get_leaderboard(kind: str, limit: int = 10,
+                    lowest_first: bool = True) -> List[Dict[str, Any]]:
+    conn = queue.redis_conn
+    key = _zset_key(kind)
+    pipe = conn.pipeline(transaction=False)
+    pipe.zcard(key)
+    if lowest_first:
+        pipe.zrange(key, 0, limit - 1, withscores=True)
+    else:
+        pipe.zrevrange(key, 0, limit - 1, withscores=True)
+    total, members = pipe.execute()
+
+    entries = []
+    for position, (entity_id, score) in enumerate(members):
+        # Rank 1 is always the best score
+        rank = total - position if lowest_first else position + 1
+        entries.append({
+            "entity_id": entity_id.decode(),
+            "average_score": score,
+            "rank": rank
+        })
+    return entries
+
+
+def get_rank(kind: str, entity_id: str) -> Optional[Dict[str, Any]]:
+    conn = queue.redis_conn
+    key = _zset_key(kind)
+    pipe = conn.pipeline(transaction=False)
+    pipe.zscore(key, entity_id)
+    pipe.zrevrank(key, entity_id)
+    pipe.zcard(key)
+    score, rev_rank, total = pipe.execute()
+    if score is None:
+        return None
+    return {
+        "entity_id": entity_id,
+        "average_score": score,
+        "rank": rev_rank + 1,
+        "total": total,
+        # Share of entities with a lower score
+        "percentile": 100.0 * (total - rev_rank - 1) / total,
+    }
+
+
+def get_histogram(kind: str) -> List[Dict[str, Any]]:
+    raw = queue.redis_conn.hgetall(_hist_key(kind))
+    counts = {int(index): int(count) for index, count in raw.items()}
+    return [{
+        "lower": SCORE_MIN + index * BUCKET_WIDTH,
+        "upper": SCORE_MIN + (index + 1) * BUCKET_WIDTH,
+        "count": counts.get(index, 0),
+    } for index in range(BUCKET_COUNT)]
+
+
+if __name__ == '__main__':
+    from . import database
+
+    parser = argparse.ArgumentParser(description="Score index maintenance")
+    parser.add_argument("--rebuild",
+                        action="store_true",
+                        help="Re-seed the indexes from Mongo")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        if queue.redis_conn is None or database.db is None:
+            print("CRITICAL: Rebuild needs both MongoDB and Redis.")
+        else:
+            rebuild("driver", database.driver_stats_collection)
+            rebuild("marshal", database.marshal_stats_collection)
+    else:
+        parser.print_help()
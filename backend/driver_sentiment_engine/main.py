@@ -1,29 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, APIRouter
+from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, APIRouter, Request, Query
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
 from starlette.middleware.cors import CORSMiddleware
-from . import models, database, queue, worker, auth
-from .services import FeedbackProcessor, RuleBasedAnalyzer, AlertingService, AISentimentAnalyzer
+from . import models, database, queue, auth, alerting, events, leaderboard
 from datetime import timedelta
 from typing import List, Dict
 
-# App State & Lifespan
-app_state = {}
-
-
+# Lifespan
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # analyzer = RuleBasedAnalyzer()
-    analyzer = AISentimentAnalyzer()
-    alerter = AlertingService()
-    processor = FeedbackProcessor(analyzer=analyzer, alerter=alerter)
-    app_state['feedback_processor'] = processor
-    print("FastAPI server starting up with AI Engine...")
+    # Scoring happens in the workers; the API only publishes submissions
+    print("FastAPI server starting up...")
     print("NOTE: Make sure your MongoDB and Redis servers are running.")
     print("NOTE: Run the RQ worker in a separate terminal.")
+    events.open_admin_events()
     print("INFO:     Application startup complete.")
     yield
     print("INFO:     Application shutdown...")
+    await events.close_admin_events()
 
 
 app = FastAPI(title="Driver Sentiment Engine", lifespan=lifespan)
@@ -41,8 +36,15 @@ app.add_middleware(
 )
 
 
-def get_feedback_processor() -> FeedbackProcessor:
-    return app_state['feedback_processor']
+def get_leaderboard_kind(
+        entity_type: models.EntityType = models.EntityType.DRIVER) -> str:
+    if entity_type not in (models.EntityType.DRIVER,
+                           models.EntityType.MARSHAL):
+        raise HTTPException(status_code=400,
+                            detail="Only DRIVER and MARSHAL are ranked")
+    if queue.redis_conn is None:
+        raise HTTPException(status_code=503, detail="Redis not connected")
+    return entity_type.value.lower()
 
 
 # Auth Endpoints
@@ -109,7 +111,6 @@ def get_config():
 def submit_feedback(
     background_tasks: BackgroundTasks,
     feedback_body: models.GenericFeedbackBody,
-    processor: FeedbackProcessor = Depends(get_feedback_processor),
     active_user: auth.ActiveUser = Depends(auth.get_current_user)):
     submission = models.GenericFeedbackSubmission(
         user_id=active_user.username,
@@ -119,10 +120,9 @@ def submit_feedback(
         trip_id=feedback_body.trip_id)
 
     try:
-        queue.feedback_queue.enqueue(worker.run_feedback_processing_job,
-                                     submission, processor)
+        queue.feedback_transport.publish(submission)
         print(
-            f"Published {submission.entity_type} feedback for {submission.entity_id} to REDIS queue."
+            f"Published {submission.entity_type} feedback for {submission.entity_id} via {queue.FEEDBACK_TRANSPORT} transport."
         )
         return {"message": "Feedback received and queued for processing."}
 
@@ -151,6 +151,26 @@ def get_marshal_statistics(marshal_id: str):
         raise HTTPException(status_code=404, detail="Marshal stats not found")
 
 
+@app.get("/driver/{driver_id}/rank", response_model=models.ScoreRank)
+def get_driver_rank(driver_id: str):
+    kind = get_leaderboard_kind(models.EntityType.DRIVER)
+    rank = leaderboard.get_rank(kind, driver_id)
+    if rank:
+        return rank
+    else:
+        raise HTTPException(status_code=404, detail="Driver rank not found")
+
+
+@app.get("/marshal/{marshal_id}/rank", response_model=models.ScoreRank)
+def get_marshal_rank(marshal_id: str):
+    kind = get_leaderboard_kind(models.EntityType.MARSHAL)
+    rank = leaderboard.get_rank(kind, marshal_id)
+    if rank:
+        return rank
+    else:
+        raise HTTPException(status_code=404, detail="Marshal rank not found")
+
+
 # Admin Dashboard Endpoints
 admin_router = APIRouter()
 
@@ -179,6 +199,45 @@ def get_admin_recent_app_feedback():
     return database.get_recent_app_feedback(limit=50)
 
 
+@admin_router.get("/leaderboard",
+                  response_model=List[models.LeaderboardEntry])
+def get_admin_leaderboard(kind: str = Depends(get_leaderboard_kind),
+                          limit: int = Query(10, ge=1, le=100),
+                          lowest_first: bool = True):
+    """(ADMIN) Get the lowest (or highest) scoring drivers or marshals."""
+    return leaderboard.get_leaderboard(kind,
+                                       limit=limit,
+                                       lowest_first=lowest_first)
+
+
+@admin_router.get("/leaderboard/histogram",
+                  response_model=List[models.ScoreBucket])
+def get_admin_score_histogram(kind: str = Depends(get_leaderboard_kind)):
+    """(ADMIN) Get the average score distribution in 0.5-star buckets."""
+    return leaderboard.get_histogram(kind)
+
+
+@admin_router.get("/alerts/metrics", response_model=models.AlertMetrics)
+def get_admin_alert_metrics():
+    """(ADMIN) Get alert dispatch counters and latency."""
+    return alerting.get_alert_metrics(queue.redis_conn)
+
+
+@admin_router.get("/stream")
+async def stream_admin_events(request: Request):
+    """(ADMIN) Live feed of stats, feedback and alert deltas (SSE)."""
+    if queue.redis_conn is None:
+        raise HTTPException(status_code=503, detail="Redis not connected")
+    pubsub = await events.subscribe_admin_events()
+    return events.EventStreamResponse(
+        events.admin_event_stream(pubsub, request.is_disconnected),
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        },
+        background=BackgroundTask(events.close_admin_subscription, pubsub))
+
+
 # Mount the admin router
 app.include_router(admin_router,
                    prefix="/admin",
@@ -0,0 +1,159 @@
+"""
+Client side of the local inference daemon (see model_server.py).
+
+Wire format, all integers big-endian. Every message is framed as
+    u32 body length | body
+
+Request body:   u8 op | u16 count | count x (u16 len | utf-8 text)
+ANALYZE reply:  u8 status | u16 count | count x (u8 label | f32 confidence)
+STATS reply:    u8 status | u64 rss_bytes | u64 requests | u64 batches
+Error reply:    u8 status (1) | utf-8 message
+
+label is 1 for POSITIVE and 0 for NEGATIVE. This module is stdlib-only so
+processes that talk to the daemon never import transformers.
+"""
+import os
+import socket
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+MODEL_SERVER_SOCKET = os.environ.get("MODEL_SERVER_SOCKET",
+                                     "/tmp/sentiment_model.sock")
+
+OP_ANALYZE = 1
+OP_STATS = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+MAX_TEXT_CHARS = 512
+
+LABELS = ("NEGATIVE", "POSITIVE")
+
+_LENGTH = struct.Struct(">I")
+_HEADER = struct.Struct(">BH")
+_TEXT_LEN = struct.Struct(">H")
+_RESULT = struct.Struct(">Bf")
+_STATS = struct.Struct(">BQQQ")
+
+
+class ModelServerError(Exception):
+    pass
+
+
+def encode_request(op: int, texts: List[str]) -> bytes:
+    parts = [_HEADER.pack(op, len(texts))]
+    for text in texts:
+        data = text[:MAX_TEXT_CHARS].encode("utf-8")
+        parts.append(_TEXT_LEN.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_request(body: bytes) -> Tuple[int, List[str]]:
+    op, count = _HEADER.unpack_from(body)
+    offset = _HEADER.size
+    texts = []
+    for _ in range(count):
+        (length, ) = _TEXT_LEN.unpack_from(body, offset)
+        offset += _TEXT_LEN.size
+        texts.append(body[offset:offset + length].decode("utf-8"))
+        offset += length
+    return op, texts
+
+
+def encode_results(results: List[Tuple[str, float]]) -> bytes:
+    parts = [_HEADER.pack(STATUS_OK, len(results))]
+    for label, confidence in results:
+        parts.append(_RESULT.pack(LABELS.index(label), confidence))
+    return b"".join(parts)
+
+
+def encode_stats(rss_bytes: int, requests: int, batches: int) -> bytes:
+    return _STATS.pack(STATUS_OK, rss_bytes, requests, batches)
+
+
+def encode_error(message: str) -> bytes:
+    return bytes([STATUS_ERROR]) + message.encode("utf-8")
+
+
+def frame(body: bytes) -> bytes:
+    return _LENGTH.pack(len(body)) + body
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class ModelClient:
+    """
+    Blocking client with one Unix socket per process. The socket is
+    re-opened after a fork (RQ work-horses, process pools).
+    """
+
+    def __init__(self,
+                 socket_path: str = MODEL_SERVER_SOCKET,
+                 timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> socket.socket:
+        if self._sock is None or self._pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._sock = sock
+            self._pid = os.getpid()
+        return self._sock
+
+    def _recv_exact(self, sock: socket.socket, size: int) -> bytes:
+        buffer = bytearray()
+        while len(buffer) < size:
+            chunk = sock.recv(size - len(buffer))
+            if not chunk:
+                raise ConnectionError("Model server closed the connection")
+            buffer += chunk
+        return bytes(buffer)
+
+    def _call(self, body: bytes) -> bytes:
+        with self._lock:
+            try:
+                sock = self._connection()
+                sock.sendall(frame(body))
+                (length, ) = _LENGTH.unpack(
+                    self._recv_exact(sock, _LENGTH.size))
+                reply = self._recv_exact(sock, length)
+            except OSError:
+                self.close()
+                raise
+        if reply[0] == STATUS_ERROR:
+            raise ModelServerError(reply[1:].decode("utf-8"))
+        return reply
+
+    def analyze_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        if not texts: return []
+        reply = self._call(encode_request(OP_ANALYZE, texts))
+        _, count = _HEADER.unpack_from(reply)
+        return [(LABELS[label], confidence)
+                for label, confidence in _RESULT.iter_unpack(
+                    reply[_HEADER.size:_HEADER.size + count * _RESULT.size])]
+
+    def stats(self) -> Dict[str, int]:
+        reply = self._call(encode_request(OP_STATS, []))
+        _, rss_bytes, requests, batches = _STATS.unpack(reply)
+        return {"rss_bytes": rss_bytes, "requests": requests, "batches": batches}
+
+    def close(self):
+        if self._sock is not None and self._pid == os.getpid():
+            self._sock.close()
+        self._sock = None
+        self._pid = None
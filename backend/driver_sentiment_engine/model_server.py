@@ -0,0 +1,132 @@
+"""
+Local inference daemon: one DistilBERT copy per host, shared over a Unix
+domain socket by the feedback workers, backfill processes and ai_services.
+
+    python -m driver_sentiment_engine.model_server
+    MODEL_SERVER_SOCKET=/tmp/sentiment_model.sock python -m driver_sentiment_engine.worker
+
+Requests from all connections are coalesced into batches of up to
+--max-batch texts, waiting at most --max-wait-ms for a batch to fill.
+The wire format is documented in model_client.py.
+"""
+import argparse
+import asyncio
+import os
+import struct
+from typing import List, Tuple
+from .model_client import (MODEL_SERVER_SOCKET, OP_ANALYZE, OP_STATS,
+                           current_rss_bytes, decode_request, encode_error,
+                           encode_results, encode_stats, frame)
+
+_LENGTH = struct.Struct(">I")
+
+
+class ModelServer:
+
+    def __init__(self, socket_path: str, max_batch: int, max_wait_ms: float):
+        from transformers import pipeline
+
+        print("Model server: loading DISTILBERT (once per host)...")
+        self.pipeline = pipeline(
+            "sentiment-analysis",
+            model="distilbert-base-uncased-finetuned-sst-2-english",
+            device=-1)
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = 0
+        self.batches = 0
+        self._pending: asyncio.Queue = None
+
+    def _infer(self, texts: List[str]) -> List[Tuple[str, float]]:
+        results = self.pipeline(texts, batch_size=self.max_batch)
+        return [(result['label'], result['score']) for result in results]
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._pending.get()]
+            size = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._pending.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in items for text in item_texts]
+            try:
+                results = await loop.run_in_executor(None, self._infer, texts)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+
+            offset = 0
+            for item_texts, future in items:
+                future.set_result(results[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    async def _handle_client(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                (length, ) = _LENGTH.unpack(
+                    await reader.readexactly(_LENGTH.size))
+                op, texts = decode_request(await reader.readexactly(length))
+                self.requests += 1
+
+                if op == OP_ANALYZE:
+                    future = loop.create_future()
+                    await self._pending.put((texts, future))
+                    try:
+                        reply = encode_results(await future)
+                    except Exception as e:
+                        reply = encode_error(f"Inference failed: {e}")
+                elif op == OP_STATS:
+                    reply = encode_stats(current_rss_bytes(), self.requests,
+                                         self.batches)
+                else:
+                    reply = encode_error(f"Unknown op {op}")
+
+                writer.write(frame(reply))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._pending = asyncio.Queue()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_client,
+                                                 path=self.socket_path)
+        print(f"Model server listening on {self.socket_path} "
+              f"(max batch {self.max_batch}, max wait "
+              f"{self.max_wait * 1000:.1f}ms)")
+        batcher = asyncio.create_task(self._batcher())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            os.unlink(self.socket_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local inference daemon")
+    parser.add_argument("--socket", default=MODEL_SERVER_SOCKET)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    asyncio.run(
+        ModelServer(args.socket, args.max_batch, args.max_wait_ms).serve())
@@ -59,6 +59,26 @@ class MarshalStat(BaseModel):
     feedback_count: int
 
 
+class ScoreRank(BaseModel):
+    entity_id: str
+    average_score: float
+    rank: int
+    total: int
+    percentile: float
+
+
+class LeaderboardEntry(BaseModel):
+    entity_id: str
+    average_score: float
+    rank: int
+
+
+class ScoreBucket(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
 # DB Storage Models (for Admin)
 
 
@@ -79,3 +99,18 @@ class AppFeedback(BaseModel):
     feedback_text: str
     trip_id: Optional[str]
     created_at: datetime
+
+
+# Alerting Models
+class AlertMetrics(BaseModel):
+    events: float
+    alerts: float
+    clears: float
+    suppressed: float
+    dropped: float
+    delivery_failures: float
+    requeued: float
+    dead_lettered: float
+    avg_dispatch_latency_ms: float
+    max_dispatch_latency_ms: float
+    outbox_depth: int
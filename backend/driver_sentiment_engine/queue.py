@@ -1,9 +1,57 @@
 import os
+from abc import ABC, abstractmethod
 from redis import Redis
 from rq import Queue
+from .models import GenericFeedbackSubmission
 
 REDIS_CONN_STR = os.environ.get("REDIS_URL", "redis://localhost:6379")
 
+# Transport Settings ("rq" or "stream")
+FEEDBACK_TRANSPORT = os.environ.get("FEEDBACK_TRANSPORT", "rq")
+FEEDBACK_STREAM = os.environ.get("FEEDBACK_STREAM", "feedback_stream")
+FEEDBACK_GROUP = os.environ.get("FEEDBACK_GROUP", "feedback_workers")
+FEEDBACK_STREAM_MAXLEN = int(
+    os.environ.get("FEEDBACK_STREAM_MAXLEN", "1000000"))
+
+# RQ resolves the job by import path inside the worker, so the API never has
+# to import worker.py (and load a model) just to enqueue.
+FEEDBACK_JOB = "driver_sentiment_engine.worker.run_feedback_processing_job"
+
+
+# Feedback Transports
+class FeedbackTransport(ABC):
+
+    @abstractmethod
+    def publish(self, submission: GenericFeedbackSubmission):
+        ...
+
+
+class RQTransport(FeedbackTransport):
+
+    def __init__(self, queue: Queue):
+        self.queue = queue
+
+    def publish(self, submission: GenericFeedbackSubmission):
+        self.queue.enqueue(FEEDBACK_JOB, submission)
+
+
+class RedisStreamTransport(FeedbackTransport):
+
+    def __init__(self,
+                 conn: Redis,
+                 stream: str = FEEDBACK_STREAM,
+                 maxlen: int = FEEDBACK_STREAM_MAXLEN):
+        self.conn = conn
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def publish(self, submission: GenericFeedbackSubmission):
+        self.conn.xadd(self.stream,
+                       {"payload": submission.model_dump_json()},
+                       maxlen=self.maxlen,
+                       approximate=True)
+
+
 try:
     #  Redis connection
     redis_conn = Redis.from_url(REDIS_CONN_STR)
@@ -13,7 +61,14 @@ try:
     # Create the feedback queue
     feedback_queue = Queue("feedback", connection=redis_conn)
 
+    if FEEDBACK_TRANSPORT == "stream":
+        feedback_transport = RedisStreamTransport(redis_conn)
+    else:
+        feedback_transport = RQTransport(feedback_queue)
+    print(f"Feedback transport: {FEEDBACK_TRANSPORT}")
+
 except Exception as e:
     print(f"Could not connect to Redis: {e}")
     redis_conn = None
     feedback_queue = None
+    feedback_transport = None
@@ -1,12 +1,22 @@
 from .models import GenericFeedbackSubmission, EntityType
 from . import database
+from .alerting import AlertOutbox
+from .events import publish_admin_event
+from .model_client import ModelClient
 import datetime
-from transformers import pipeline
+import os
+from typing import List, Optional, Tuple
+
+# Largest number of texts handed to the pipeline in one forward pass
+ANALYZE_BATCH_SIZE = 32
 
 
 class AISentimentAnalyzer:
 
     def __init__(self):
+        # Imported here so processes using the model server stay lean
+        from transformers import pipeline
+
         print("Loading AI Brain (DISTILBERT)... This runs once at startup")
 
         self.pipeline = pipeline(
@@ -14,22 +24,61 @@ class AISentimentAnalyzer:
             model="distilbert-base-uncased-finetuned-sst-2-english",
               device = -1)
 
+    @staticmethod
+    def _to_stars(label: str, confidence: float) -> float:
+        if label == 'POSITIVE':
+            final_score = 3.0 + (2.0 * confidence)
+        else:
+            final_score = 3.0 - (2.0 * confidence)
+
+        return max(1.0, min(5.0, final_score))
+
     def analyze(self, text: str) -> float:
         safe_text = text[:512]
         result = self.pipeline(safe_text)[0]
         label = result['label']
         confidence = result['score']
 
-        if label == 'POSITIVE':
-            final_score = 3.0 + (2.0 * confidence)
-        else:
-            final_score = 3.0 - (2.0 * confidence)
-
-        final_score = max(1.0, min(5.0, final_score))
+        final_score = self._to_stars(label, confidence)
 
         print(f"AI Analysis: '{safe_text[:30]}...' -> {label} ({confidence:.2f}) -> Stars: {final_score: .2f}")
         return final_score
 
+    def analyze_batch(self, texts: List[str]) -> List[float]:
+        if not texts: return []
+        safe_texts = [text[:512] for text in texts]
+        results = self.pipeline(safe_texts, batch_size=ANALYZE_BATCH_SIZE)
+        scores = [
+            self._to_stars(result['label'], result['score'])
+            for result in results
+        ]
+        print(f"AI Analysis: batch of {len(scores)} texts scored.")
+        return scores
+
+
+class RemoteSentimentAnalyzer:
+    """Same scoring as AISentimentAnalyzer, served by model_server.py."""
+
+    def __init__(self, client: Optional[ModelClient] = None):
+        self.client = client or ModelClient()
+
+    def analyze(self, text: str) -> float:
+        return self.analyze_batch([text])[0]
+
+    def analyze_batch(self, texts: List[str]) -> List[float]:
+        return [
+            AISentimentAnalyzer._to_stars(label, confidence)
+            for label, confidence in self.client.analyze_batch(texts)
+        ]
+
+
+def build_sentiment_analyzer():
+    """Use the shared model server when MODEL_SERVER_SOCKET is set."""
+    if os.environ.get("MODEL_SERVER_SOCKET"):
+        print("Using shared model server for sentiment analysis.")
+        return RemoteSentimentAnalyzer()
+    return AISentimentAnalyzer()
+
 
 # Sentiment Analyzer
 class RuleBasedAnalyzer:
@@ -70,17 +119,26 @@ class RuleBasedAnalyzer:
         print(f"Sentiment score: {score:.2f}")
         return score
 
+    def analyze_batch(self, texts: List[str]) -> List[float]:
+        return [self.analyze(text) for text in texts]
+
 
 # Alerting Service
 class AlertingService:
 
-    def __init__(self, threshold: float = 2.0):
+    def __init__(self,
+                 threshold: float = 2.0,
+                 outbox: Optional[AlertOutbox] = None):
         self.threshold = threshold
+        self.outbox = outbox
 
     def check_and_raise_alert(self, entity_type: str, entity_id: str,
                               new_avg_score: float):
 
-        if new_avg_score < self.threshold:
+        # Dedup and delivery happen in the alert dispatcher, off this path
+        if self.outbox is not None:
+            self.outbox.publish(entity_type, entity_id, new_avg_score)
+        elif new_avg_score < self.threshold:
             print(
                 f"!!! ALERT: {entity_type} {entity_id} score is low: {new_avg_score:.2f} !!!"
             )
@@ -110,21 +168,31 @@ class FeedbackProcessor:
             print(f"ERROR: No update function for entity type {entity_type}")
             return
 
-        new_avg = update_function(entity_id=entity_id, new_score=score)
+        stats = update_function(entity_id=entity_id, new_score=score)
 
         print(f"Processing scored feedback for {entity_type} {entity_id}...")
 
-        if new_avg is not None:
-            self.alerter.check_and_raise_alert(entity_type=entity_type.value,
-                                               entity_id=entity_id,
-                                               new_avg_score=new_avg)
-
-        if entity_type == EntityType.DRIVER:
-            database.save_simple_feedback(database.trip_feedback_collection,
-                                          submission_data)
-        elif entity_type == EntityType.MARSHAL:
-            database.save_simple_feedback(database.trip_feedback_collection,
-                                          submission_data)
+        # The stats update is the commit point: a redelivery would fold the
+        # score in again, so nothing after it may fail the submission.
+        try:
+            if stats is not None:
+                publish_admin_event(f"{entity_type.value.lower()}_stats",
+                                    stats)
+                self.alerter.check_and_raise_alert(
+                    entity_type=entity_type.value,
+                    entity_id=entity_id,
+                    new_avg_score=stats['average_score'])
+
+            if entity_type == EntityType.DRIVER:
+                database.save_simple_feedback(
+                    database.trip_feedback_collection, submission_data)
+            elif entity_type == EntityType.MARSHAL:
+                database.save_simple_feedback(
+                    database.trip_feedback_collection, submission_data)
+            publish_admin_event("trip_feedback", submission_data)
+        except Exception as e:
+            print(f"ERROR: Stats updated but could not save feedback for "
+                  f"{entity_type} {entity_id}: {e}")
 
     def _process_simple_entity(self, entity_type: EntityType,
                                submission_data: dict):
@@ -134,28 +202,76 @@ class FeedbackProcessor:
         if entity_type == EntityType.APP:
             database.save_simple_feedback(database.app_feedback_collection,
                                           submission_data)
+            publish_admin_event("app_feedback", submission_data)
         elif entity_type == EntityType.TRIP:
             print("NOTE: Simple TRIP feedback noted.")
 
     def process_feedback(self, submission: GenericFeedbackSubmission):
+        failures = self.process_batch([submission])
+        if failures:
+            raise failures[0][1]
+
+    def process_batch(
+        self, submissions: List[GenericFeedbackSubmission]
+    ) -> List[Tuple[GenericFeedbackSubmission, Exception]]:
+        """
+        Process a batch and return the submissions that failed, which is
+        only ever before their stats were updated. Their trips are released
+        again so a redelivery is not skipped as a duplicate.
+        If scoring itself fails, every trip is released and the error is
+        raised.
+        """
         # Check idempotency
-        if not database.check_and_mark_trip(submission.trip_id):
-            return
+        fresh = [
+            submission for submission in submissions
+            if database.check_and_mark_trip(submission.trip_id)
+        ]
+
+        # Score every driver/marshal text in a single analyzer call
+        scored = [
+            submission for submission in fresh
+            if submission.entity_type in (EntityType.DRIVER, EntityType.MARSHAL)
+        ]
+        try:
+            scores = self.analyzer.analyze_batch(
+                [submission.feedback_text for submission in scored])
+        except Exception:
+            for submission in fresh:
+                database.unmark_trip(submission.trip_id)
+            raise
+        score_by_submission = {
+            id(submission): score
+            for submission, score in zip(scored, scores)
+        }
 
+        failures = []
+        for submission in fresh:
+            try:
+                self._process_one(submission,
+                                  score_by_submission.get(id(submission)))
+            except Exception as e:
+                print(
+                    f"ERROR: Failed to process feedback for {submission.entity_id}: {e}"
+                )
+                database.unmark_trip(submission.trip_id)
+                failures.append((submission, e))
+        return failures
+
+    def _process_one(self, submission: GenericFeedbackSubmission,
+                     score: Optional[float]):
         # Prepare data
         submission_data = submission.model_dump()
         submission_data["created_at"] = datetime.datetime.now(datetime.UTC)
 
         # Handle scored entities
-        if submission.entity_type in (EntityType.DRIVER, EntityType.MARSHAL):
-            score = self.analyzer.analyze(submission.feedback_text)
+        if score is not None:
             submission_data["score"] = score
             self._process_scored_entity(entity_type=submission.entity_type,
                                         entity_id=submission.entity_id,
                                         score=score,
                                         submission_data=submission_data)
 
-        # 4. Handle simple entities
+        # Handle simple entities
         elif submission.entity_type in (EntityType.APP, EntityType.TRIP):
             self._process_simple_entity(entity_type=submission.entity_type,
                                         submission_data=submission_data)
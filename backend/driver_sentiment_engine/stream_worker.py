@@ -0,0 +1,265 @@
+import argparse
+import os
+import socket
+import time
+from typing import List, Optional, Tuple
+from redis import Redis
+from redis.exceptions import ResponseError
+from . import models
+from .queue import (FEEDBACK_STREAM, FEEDBACK_GROUP, FEEDBACK_STREAM_MAXLEN,
+                    REDIS_CONN_STR)
+from .services import FeedbackProcessor
+
+# Consumer Settings
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", "64"))
+STREAM_BLOCK_MS = int(os.environ.get("STREAM_BLOCK_MS", "5000"))
+# Entries pending longer than this on a dead consumer are re-claimed
+STREAM_CLAIM_IDLE_MS = int(os.environ.get("STREAM_CLAIM_IDLE_MS", "60000"))
+# Entries that keep failing are moved to "<stream>:dead" after this many tries
+STREAM_MAX_DELIVERIES = int(os.environ.get("STREAM_MAX_DELIVERIES", "5"))
+# Backoff while a whole batch fails (e.g. the model server is down)
+STREAM_RETRY_BACKOFF_SECONDS = float(
+    os.environ.get("STREAM_RETRY_BACKOFF_SECONDS", "1"))
+STREAM_MAX_BACKOFF_SECONDS = float(
+    os.environ.get("STREAM_MAX_BACKOFF_SECONDS", "30"))
+
+
+def dead_letter_stream(stream: str) -> str:
+    return f"{stream}:dead"
+
+
+def replay_dead_letters(conn: Redis,
+                        stream: str = FEEDBACK_STREAM,
+                        count: int = 100) -> int:
+    """Move every dead-lettered entry back onto the stream. Returns the
+    number replayed."""
+    dead = dead_letter_stream(stream)
+    replayed = 0
+    while True:
+        entries = conn.xrange(dead, count=count)
+        if not entries:
+            return replayed
+        # Re-added and removed together, so an entry is never lost or doubled
+        pipe = conn.pipeline()
+        for entry_id, fields in entries:
+            pipe.xadd(stream,
+                      fields,
+                      maxlen=FEEDBACK_STREAM_MAXLEN,
+                      approximate=True)
+            pipe.xdel(dead, entry_id)
+        pipe.execute()
+        replayed += len(entries)
+
+
+class StreamConsumer:
+    """
+    Reads feedback from a Redis Stream as part of a consumer group and
+    hands it to the FeedbackProcessor in batches.
+    """
+
+    def __init__(self,
+                 conn: Redis,
+                 processor: FeedbackProcessor,
+                 stream: str = FEEDBACK_STREAM,
+                 group: str = FEEDBACK_GROUP,
+                 consumer: Optional[str] = None,
+                 batch_size: int = STREAM_BATCH_SIZE,
+                 block_ms: int = STREAM_BLOCK_MS,
+                 claim_idle_ms: int = STREAM_CLAIM_IDLE_MS,
+                 max_deliveries: int = STREAM_MAX_DELIVERIES,
+                 retry_backoff_seconds: float = STREAM_RETRY_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = STREAM_MAX_BACKOFF_SECONDS,
+                 track_latency: bool = False):
+        self.conn = conn
+        self.processor = processor
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        # Held entries must be touched again before they look idle
+        self.max_backoff_seconds = min(max_backoff_seconds,
+                                       claim_idle_ms / 2000)
+        self.dead_letter_stream = dead_letter_stream(stream)
+        self._claim_cursor = "0-0"
+        self._last_claim = 0.0
+        # Publish-to-ack latency (seconds) of every entry, for benchmarks
+        self.track_latency = track_latency
+        self.latencies: List[float] = []
+
+    def ensure_group(self):
+        try:
+            self.conn.xgroup_create(self.stream,
+                                    self.group,
+                                    id="0",
+                                    mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _reclaim(self) -> List[Tuple[bytes, dict]]:
+        # Only sweep for stuck entries every so often, not on every read
+        if (time.monotonic() - self._last_claim) * 1000 < self.claim_idle_ms / 2:
+            return []
+        response = self.conn.xautoclaim(self.stream,
+                                        self.group,
+                                        self.consumer,
+                                        min_idle_time=self.claim_idle_ms,
+                                        start_id=self._claim_cursor,
+                                        count=self.batch_size)
+        self._claim_cursor = response[0]
+        if self._claim_cursor in ("0-0", b"0-0"):
+            self._last_claim = time.monotonic()
+        entries = [entry for entry in response[1] if entry[1]]
+        if not entries:
+            return []
+
+        pending = self.conn.xpending_range(self.stream,
+                                           self.group,
+                                           min=entries[0][0],
+                                           max=entries[-1][0],
+                                           count=len(entries),
+                                           consumername=self.consumer)
+        deliveries = {p["message_id"]: p["times_delivered"] for p in pending}
+        retry = []
+        for entry_id, fields in entries:
+            if deliveries.get(entry_id, 0) > self.max_deliveries:
+                print(f"STREAM WORKER: Giving up on {entry_id}, moved to "
+                      f"{self.dead_letter_stream}")
+                self.conn.xadd(self.dead_letter_stream, fields)
+                self.conn.xack(self.stream, self.group, entry_id)
+            else:
+                retry.append((entry_id, fields))
+        return retry
+
+    def _read(self, block_ms: Optional[int]) -> List[Tuple[bytes, dict]]:
+        response = self.conn.xreadgroup(self.group,
+                                        self.consumer, {self.stream: ">"},
+                                        count=self.batch_size,
+                                        block=block_ms)
+        if not response:
+            return []
+        return response[0][1]
+
+    def _hold(self, entries: List[Tuple[bytes, dict]]):
+        # Re-claiming with JUSTID resets the idle time without counting a
+        # delivery, so held entries are neither re-claimed nor dead-lettered
+        self.conn.xclaim(self.stream,
+                         self.group,
+                         self.consumer,
+                         min_idle_time=0,
+                         message_ids=[entry_id for entry_id, _ in entries],
+                         justid=True)
+
+    def handle_batch(self, entries: List[Tuple[bytes, dict]]
+                     ) -> List[Tuple[bytes, dict]]:
+        """
+        Process and ACK a batch. Entries that failed on their own stay
+        pending for XAUTOCLAIM. If the whole batch failed (nothing was
+        applied), its entries are returned for the caller to retry.
+        """
+        parsed = []
+        done_ids = []
+        for entry_id, fields in entries:
+            try:
+                parsed.append(
+                    (entry_id,
+                     models.GenericFeedbackSubmission.model_validate_json(
+                         fields[b"payload"])))
+            except Exception as e:
+                print(f"STREAM WORKER: Dropping malformed entry {entry_id}: {e}")
+                done_ids.append(entry_id)
+
+        try:
+            failures = self.processor.process_batch(
+                [submission for _, submission in parsed])
+        except Exception as e:
+            # Nothing was applied and the entries themselves are likely fine
+            print(f"STREAM WORKER: Batch failed ({e}). Will retry it.")
+            if done_ids:
+                self.conn.xack(self.stream, self.group, *done_ids)
+            return [(entry_id, fields) for entry_id, fields in entries
+                    if entry_id not in done_ids]
+
+        failed = {id(submission) for submission, _ in failures}
+        done_ids += [
+            entry_id for entry_id, submission in parsed
+            if id(submission) not in failed
+        ]
+        if failed:
+            print(f"STREAM WORKER: {len(failed)} entries left for redelivery.")
+        if done_ids:
+            self.conn.xack(self.stream, self.group, *done_ids)
+
+        if self.track_latency:
+            self._record_latencies(done_ids)
+        return []
+
+    def _record_latencies(self, done_ids: List[bytes]):
+        # Stream IDs start with the millisecond timestamp of the XADD
+        now_ms = time.time() * 1000
+        for entry_id in done_ids:
+            published_ms = int(entry_id.split(b"-")[0])
+            self.latencies.append((now_ms - published_ms) / 1000)
+
+    def run(self, burst: bool = False) -> int:
+        """
+        Consume until stopped. With burst=True, return once the stream has
+        no new entries left. Returns the number of entries handled.
+        """
+        self.ensure_group()
+        print(
+            f"Stream worker {self.consumer} reading {self.stream} as group {self.group}"
+        )
+        handled = 0
+        retry: List[Tuple[bytes, dict]] = []
+        backoff = 0.0
+        while True:
+            # During an outage, keep retrying the held batch instead of
+            # reading more entries and burning their delivery attempts
+            entries = retry or self._reclaim()
+            if not entries:
+                entries = self._read(None if burst else self.block_ms)
+            if not entries:
+                if burst:
+                    return handled
+                continue
+            retry = self.handle_batch(entries)
+            handled += len(entries) - len(retry)
+            if not retry:
+                backoff = 0.0
+                continue
+            backoff = min(max(backoff * 2, self.retry_backoff_seconds),
+                          self.max_backoff_seconds)
+            print(f"STREAM WORKER: Backing off {backoff:.1f}s.")
+            self._hold(retry)
+            time.sleep(backoff)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Redis Streams feedback worker")
+    parser.add_argument("--replay-dead",
+                        action="store_true",
+                        help="Move dead-lettered entries back onto the stream")
+    args = parser.parse_args()
+
+    if args.replay_dead:
+        try:
+            redis_conn = Redis.from_url(REDIS_CONN_STR)
+            replayed = replay_dead_letters(redis_conn)
+            print(f"STREAM WORKER: Replayed {replayed} entries from "
+                  f"{dead_letter_stream(FEEDBACK_STREAM)}")
+
+        except Exception as e:
+            print(f"CRITICAL: Could not replay dead letters. Redis error: {e}")
+    else:
+        from .worker import processor
+        try:
+            redis_conn = Redis.from_url(REDIS_CONN_STR)
+            StreamConsumer(redis_conn, processor).run()
+
+        except Exception as e:
+            print(f"CRITICAL: Stream worker failed to start. Redis error: {e}")
@@ -1,9 +1,9 @@
 import os
 from redis import Redis
 from rq import Worker, Queue
-from . import database, models
+from . import database, models, alerting
 # 1. Import your services (Logic)
-from .services import FeedbackProcessor, AISentimentAnalyzer, AlertingService
+from .services import FeedbackProcessor, AlertingService, build_sentiment_analyzer
 
 # 2. Queue name (must match queue.py)
 listen = ['feedback']
@@ -12,8 +12,8 @@ REDIS_CONN_STR = os.environ.get("REDIS_URL", "redis://localhost:6379")
 
 # --- INITIALIZE THE BRAIN (GLOBAL) ---
 print("Worker: Loading AI Model...")
-analyzer = AISentimentAnalyzer()
-alerter = AlertingService()
+analyzer = build_sentiment_analyzer()
+alerter = AlertingService(outbox=alerting.default_outbox())
 processor = FeedbackProcessor(analyzer=analyzer, alerter=alerter)
 
 def run_feedback_processing_job(submission: models.GenericFeedbackSubmission, *args):
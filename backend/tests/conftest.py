@@ -0,0 +1,203 @@
+import os
+
+# Point the module-level Mongo/Redis clients at nothing and fail fast, so
+# importing the package needs no running services.
+os.environ.setdefault("MONGO_CONN_STR",
+                      "mongodb://localhost:1/?serverSelectionTimeoutMS=100")
+os.environ.setdefault("REDIS_URL", "redis://localhost:1")
+
+import pytest
+
+
+def _b(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+
+        def record(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return record
+
+    def execute(self):
+        results = [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.calls
+        ]
+        self.calls = []
+        return results
+
+
+class FakeRedis:
+    """In-memory stand-in for the handful of Redis commands under test."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.lists = {}
+        self.zsets = {}
+        self.streams = {}
+        # Stream -> entry id -> times delivered (a single consumer group)
+        self.pending = {}
+        self.delivered_up_to = {}
+        self._next_id = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        for key in keys:
+            for store in (self.hashes, self.lists, self.zsets):
+                store.pop(key, None)
+
+    # Hashes
+    def hset(self, name, key=None, value=None, mapping=None):
+        target = self.hashes.setdefault(name, {})
+        if key is not None:
+            target[_b(key)] = _b(value)
+        for k, v in (mapping or {}).items():
+            target[_b(k)] = _b(v)
+
+    def hget(self, name, key):
+        return self.hashes.get(name, {}).get(_b(key))
+
+    def hmget(self, name, keys):
+        return [self.hget(name, key) for key in keys]
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def hincrby(self, name, key, amount=1):
+        value = int(self.hget(name, key) or 0) + amount
+        self.hset(name, key, value)
+        return value
+
+    def hincrbyfloat(self, name, key, amount=1.0):
+        value = float(self.hget(name, key) or 0) + amount
+        self.hset(name, key, value)
+        return value
+
+    # Lists
+    def lpush(self, name, *values):
+        for value in values:
+            self.lists.setdefault(name, []).insert(0, _b(value))
+
+    def rpush(self, name, *values):
+        self.lists.setdefault(name, []).extend(_b(v) for v in values)
+
+    def llen(self, name):
+        return len(self.lists.get(name, []))
+
+    def lmove(self, source, destination, src="LEFT", dest="RIGHT"):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop(0 if src == "LEFT" else -1)
+        if dest == "LEFT":
+            self.lpush(destination, value)
+        else:
+            self.rpush(destination, value)
+        return value
+
+    def blmove(self, source, destination, timeout, src="LEFT", dest="RIGHT"):
+        return self.lmove(source, destination, src, dest)
+
+    def lrange(self, name, start, end):
+        items = self.lists.get(name, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    # Streams
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        self._next_id += 1
+        entry_id = f"{1_700_000_000_000 + self._next_id}-0".encode()
+        self.streams.setdefault(name, []).append(
+            (entry_id, {_b(k): _b(v)
+                        for k, v in fields.items()}))
+        return entry_id
+
+    def xrange(self, name, min="-", max="+", count=None):
+        return list(self.streams.get(name, []))[:count]
+
+    def xdel(self, name, *ids):
+        self.streams[name] = [
+            entry for entry in self.streams.get(name, []) if entry[0] not in ids
+        ]
+
+    def xgroup_create(self, name, groupname, id="0", mkstream=False):
+        self.streams.setdefault(name, [])
+
+    def xreadgroup(self, groupname, consumername, streams, count=None,
+                   block=None):
+        (name, _), = streams.items()
+        start = self.delivered_up_to.get(name, 0)
+        entries = self.streams.get(name, [])[start:start + count]
+        self.delivered_up_to[name] = start + len(entries)
+        for entry_id, _ in entries:
+            self.pending.setdefault(name, {})[entry_id] = 1
+        return [[_b(name), entries]] if entries else []
+
+    def xautoclaim(self, name, groupname, consumername, min_idle_time,
+                   start_id="0-0", count=None):
+        # Every pending entry counts as idle
+        pending = self.pending.get(name, {})
+        entries = [entry for entry in self.streams.get(name, [])
+                   if entry[0] in pending][:count]
+        for entry_id, _ in entries:
+            pending[entry_id] += 1
+        return [b"0-0", entries, []]
+
+    def xpending_range(self, name, groupname, min, max, count,
+                       consumername=None):
+        return [{
+            "message_id": entry_id,
+            "times_delivered": times
+        } for entry_id, times in self.pending.get(name, {}).items()]
+
+    def xclaim(self, name, groupname, consumername, min_idle_time,
+               message_ids, justid=False):
+        # JUSTID does not count a delivery
+        assert justid
+        return list(message_ids)
+
+    def xack(self, name, groupname, *ids):
+        pending = self.pending.get(name, {})
+        return sum(1 for entry_id in ids
+                   if pending.pop(entry_id, None) is not None)
+
+    # Sorted sets
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(
+            {_b(k): float(v)
+             for k, v in mapping.items()})
+
+    def zscore(self, name, member):
+        return self.zsets.get(name, {}).get(_b(member))
+
+    def zcard(self, name):
+        return len(self.zsets.get(name, {}))
+
+    def _ordered(self, name):
+        return sorted(self.zsets.get(name, {}).items(),
+                      key=lambda item: (item[1], item[0]))
+
+    def zrange(self, name, start, end, withscores=False):
+        return self._ordered(name)[start:end + 1]
+
+    def zrevrange(self, name, start, end, withscores=False):
+        return self._ordered(name)[::-1][start:end + 1]
+
+    def zrevrank(self, name, member):
+        members = [m for m, _ in self._ordered(name)[::-1]]
+        return members.index(_b(member)) if _b(member) in members else None
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
@@ -0,0 +1,170 @@
+import json
+import pytest
+from driver_sentiment_engine import alerting
+from driver_sentiment_engine.alerting import AlertDispatcher, AlertSink
+
+
+class RecordingSink(AlertSink):
+
+    def __init__(self, name="log", failures=0):
+        self.name = name
+        self.failures = failures
+        self.batches = []
+
+    def deliver(self, alerts):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("sink down")
+        self.batches.append(alerts)
+
+
+def event(score, ts, entity_id="D1"):
+    return {
+        "entity_type": "DRIVER",
+        "entity_id": entity_id,
+        "score": score,
+        "ts": ts
+    }
+
+
+def make_dispatcher(conn=None, sinks=None, max_requeues=5):
+    return AlertDispatcher(conn,
+                           sinks or [RecordingSink()],
+                           threshold=2.0,
+                           clear_threshold=2.5,
+                           cooldown_seconds=3600,
+                           delivery_attempts=1,
+                           max_requeues=max_requeues)
+
+
+def fresh_states(*entity_ids):
+    return {
+        f"DRIVER:{entity_id}": {
+            "alerting": False,
+            "last_alert_at": 0.0
+        }
+        for entity_id in entity_ids
+    }
+
+
+def test_hysteresis_and_cooldown_transitions():
+    dispatcher = make_dispatcher()
+    states = fresh_states("D1")
+    events = [
+        event(1.5, 10_000),  # crosses below threshold -> ALERT
+        event(1.8, 10_010),  # still low -> suppressed duplicate
+        event(2.3, 10_020),  # above threshold, below clear -> suppressed
+        event(3.0, 10_030),  # recovered -> CLEAR
+        event(1.5, 10_040),  # low again inside cooldown -> suppressed
+        event(1.5, 10_000 + 3600),  # cooldown over -> ALERT
+    ]
+
+    decided, suppressed = dispatcher._decide(events, states)
+    alerts = [alert for _, alert in decided]
+
+    assert [a["kind"] for a in alerts] == ["ALERT", "CLEAR", "ALERT"]
+    assert [a["score"] for a in alerts] == [1.5, 3.0, 1.5]
+    assert suppressed == 3
+    assert states["DRIVER:D1"] == {
+        "alerting": True,
+        "last_alert_at": 10_000 + 3600
+    }
+
+
+def test_healthy_entity_raises_nothing():
+    dispatcher = make_dispatcher()
+    alerts, suppressed = dispatcher._decide([event(4.0, 1), event(2.2, 2)],
+                                            fresh_states("D1"))
+    assert alerts == []
+    assert suppressed == 0
+
+
+def test_entities_are_tracked_independently():
+    dispatcher = make_dispatcher()
+    decided, _ = dispatcher._decide(
+        [event(1.0, 10_000, "D1"), event(1.0, 10_000, "D2")],
+        fresh_states("D1", "D2"))
+    assert [a["entity_id"] for _, a in decided] == ["D1", "D2"]
+
+
+def test_delivered_batch_commits_state(fake_redis):
+    sink = RecordingSink()
+    dispatcher = make_dispatcher(fake_redis, [sink])
+
+    dispatcher.dispatch_batch([event(1.0, 10_000)])
+
+    assert len(sink.batches) == 1
+    state = json.loads(fake_redis.hget(alerting.STATE_KEY, "DRIVER:D1"))
+    assert state["alerting"] is True
+    assert fake_redis.lrange(alerting.OUTBOX_KEY, 0, -1) == []
+
+
+def test_failed_delivery_keeps_state_and_requeues_in_order(fake_redis):
+    sink = RecordingSink(failures=1)
+    dispatcher = make_dispatcher(fake_redis, [sink])
+    for score, ts in [(1.0, 10_000), (3.0, 10_010)]:
+        fake_redis.lpush(alerting.OUTBOX_KEY, json.dumps(event(score, ts)))
+    batch = dispatcher._read_batch(block=False)
+    # Arrives while the batch is out; must stay behind the retried events
+    fake_redis.lpush(alerting.OUTBOX_KEY, json.dumps(event(4.0, 10_020, "D2")))
+
+    dispatcher.dispatch_batch(batch)
+
+    # Not remembered as sent, so the retry is not suppressed as a duplicate
+    assert fake_redis.hget(alerting.STATE_KEY, "DRIVER:D1") is None
+    assert fake_redis.lrange(alerting.PROCESSING_KEY, 0, -1) == []
+    assert fake_redis.hget(alerting.METRICS_KEY, "delivery_failures") == b"1"
+
+    retry = dispatcher._read_batch(block=False)
+    assert [(e["entity_id"], e["score"]) for e in retry] == [("D1", 1.0),
+                                                             ("D1", 3.0),
+                                                             ("D2", 4.0)]
+    dispatcher.dispatch_batch(retry)
+
+    assert [a["kind"] for a in sink.batches[0]] == ["ALERT", "CLEAR"]
+    state = json.loads(fake_redis.hget(alerting.STATE_KEY, "DRIVER:D1"))
+    assert state["alerting"] is False
+
+
+def test_retry_goes_only_to_the_sink_that_failed(fake_redis):
+    log = RecordingSink("log")
+    webhook = RecordingSink("webhook", failures=1)
+    dispatcher = make_dispatcher(fake_redis, [log, webhook])
+    fake_redis.lpush(alerting.OUTBOX_KEY, json.dumps(event(1.0, 10_000)))
+
+    dispatcher.run(burst=True)
+
+    assert len(log.batches) == 1
+    assert [a["kind"] for batch in webhook.batches for a in batch] == ["ALERT"]
+    state = json.loads(fake_redis.hget(alerting.STATE_KEY, "DRIVER:D1"))
+    assert state["alerting"] is True
+    assert fake_redis.llen(alerting.OUTBOX_KEY) == 0
+
+
+def test_sink_that_stays_down_is_given_up_on(fake_redis):
+    log = RecordingSink("log")
+    webhook = RecordingSink("webhook", failures=100)
+    dispatcher = make_dispatcher(fake_redis, [log, webhook], max_requeues=2)
+    fake_redis.lpush(alerting.OUTBOX_KEY, json.dumps(event(1.0, 10_000)))
+
+    dispatcher.run(burst=True)
+
+    # One real attempt plus two re-queues, then parked in the dead list
+    assert webhook.failures == 97
+    assert len(log.batches) == 1
+    dead = [json.loads(e) for e in fake_redis.lrange(alerting.DEAD_KEY, 0, -1)]
+    assert [(e["attempts"], e["sinks"]) for e in dead] == [(3, ["webhook"])]
+    assert fake_redis.llen(alerting.OUTBOX_KEY) == 0
+    # Given up on, so the alert counts as sent and later lows are suppressed
+    state = json.loads(fake_redis.hget(alerting.STATE_KEY, "DRIVER:D1"))
+    assert state["alerting"] is True
+    assert fake_redis.hget(alerting.METRICS_KEY, "dead_lettered") == b"1"
+
+
+def test_sink_without_deliver_fails_at_construction():
+
+    class BrokenSink(AlertSink):
+        pass
+
+    with pytest.raises(TypeError):
+        BrokenSink()
@@ -0,0 +1,51 @@
+import datetime
+from driver_sentiment_engine import database
+from driver_sentiment_engine.backfill import fold_feedback
+
+T0 = datetime.datetime(2026, 1, 1)
+
+
+def doc(minutes, doc_id):
+    return {
+        "created_at": T0 + datetime.timedelta(minutes=minutes),
+        "_id": doc_id
+    }
+
+
+def empty_row():
+    return {"driver_id": "D1", "average_score": None, "feedback_count": 0}
+
+
+def test_first_score_seeds_the_average():
+    row = empty_row()
+    assert fold_feedback(row, doc(0, 1), 4.0)
+    assert row["average_score"] == 4.0
+    assert row["feedback_count"] == 1
+
+
+def test_scores_fold_in_as_ema():
+    row = empty_row()
+    fold_feedback(row, doc(0, 1), 4.0)
+    fold_feedback(row, doc(1, 2), 2.0)
+    assert row["average_score"] == database.next_ema(4.0, 2.0)
+    assert row["feedback_count"] == 2
+
+
+def test_already_folded_feedback_is_skipped_on_resume():
+    row = empty_row()
+    fold_feedback(row, doc(0, 1), 4.0)
+    fold_feedback(row, doc(1, 2), 2.0)
+    snapshot = dict(row)
+
+    # Replayed after a crash between flushing stats and the checkpoint
+    assert not fold_feedback(row, doc(0, 1), 4.0)
+    assert not fold_feedback(row, doc(1, 2), 2.0)
+    assert row == snapshot
+
+
+def test_same_timestamp_is_ordered_by_id():
+    row = empty_row()
+    fold_feedback(row, doc(0, 5), 4.0)
+    assert not fold_feedback(row, doc(0, 4), 1.0)
+    assert fold_feedback(row, doc(0, 6), 1.0)
+    assert row["feedback_count"] == 2
@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
+from driver_sentiment_engine.events import EventStreamResponse
+
+
+async def body():
+    yield "data: {}\n\n"
+
+
+def respond(send, spec_version="2.4"):
+    closed = []
+
+    async def close():
+        closed.append(True)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    response = EventStreamResponse(body(), background=BackgroundTask(close))
+    scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+    return closed, response(scope, receive, send)
+
+
+def test_cleanup_runs_once_after_a_complete_stream():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    closed, call = respond(send)
+    asyncio.run(call)
+
+    assert sent[0]["type"] == "http.response.start"
+    assert closed == [True]
+
+
+def test_cleanup_runs_when_client_is_gone_before_the_body():
+
+    async def send(message):
+        raise OSError("connection reset")
+
+    closed, call = respond(send)
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(call)
+
+    assert closed == [True]
@@ -0,0 +1,70 @@
+import pytest
+from driver_sentiment_engine import leaderboard, queue
+
+
+@pytest.fixture
+def ranked(fake_redis, monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", fake_redis)
+    fake_redis.zadd("leaderboard:driver", {
+        "D1": 1.2,
+        "D2": 2.5,
+        "D3": 3.8,
+        "D4": 4.9
+    })
+    return fake_redis
+
+
+@pytest.mark.parametrize("score, bucket", [
+    (1.0, 0),
+    (1.49, 0),
+    (1.5, 1),
+    (3.0, 4),
+    (4.99, 7),
+    (5.0, 7),
+    (0.5, 0),
+])
+def test_bucket_for(score, bucket):
+    assert leaderboard.bucket_for(score) == bucket
+
+
+def test_rank_and_percentile_of_best_and_worst(ranked):
+    best = leaderboard.get_rank("driver", "D4")
+    assert best["rank"] == 1
+    assert best["total"] == 4
+    assert best["percentile"] == 75.0
+
+    worst = leaderboard.get_rank("driver", "D1")
+    assert worst["rank"] == 4
+    assert worst["percentile"] == 0.0
+
+
+def test_rank_of_only_entity(fake_redis, monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", fake_redis)
+    fake_redis.zadd("leaderboard:driver", {"D1": 3.0})
+    rank = leaderboard.get_rank("driver", "D1")
+    assert (rank["rank"], rank["percentile"]) == (1, 0.0)
+
+
+def test_unknown_entity_has_no_rank(ranked):
+    assert leaderboard.get_rank("driver", "nope") is None
+
+
+def test_bottom_n_keeps_best_first_ranks(ranked):
+    bottom = leaderboard.get_leaderboard("driver", limit=2)
+    assert [(e["entity_id"], e["rank"]) for e in bottom] == [("D1", 4),
+                                                             ("D2", 3)]
+
+
+def test_top_n(ranked):
+    top = leaderboard.get_leaderboard("driver", limit=2, lowest_first=False)
+    assert [(e["entity_id"], e["rank"]) for e in top] == [("D4", 1),
+                                                          ("D3", 2)]
+
+
+def test_histogram_fills_missing_buckets(fake_redis, monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", fake_redis)
+    fake_redis.hset("score_hist:driver", mapping={0: 2, 7: 1})
+    histogram = leaderboard.get_histogram("driver")
+    assert len(histogram) == leaderboard.BUCKET_COUNT
+    assert [b["count"] for b in histogram] == [2, 0, 0, 0, 0, 0, 0, 1]
+    assert (histogram[0]["lower"], histogram[-1]["upper"]) == (1.0, 5.0)
@@ -0,0 +1,107 @@
+import importlib.util
+import pathlib
+import socket
+import struct
+import threading
+import pytest
+from driver_sentiment_engine import model_client
+from driver_sentiment_engine.model_client import (ModelClient,
+                                                  ModelServerError)
+
+
+def test_request_round_trip_keeps_multibyte_text():
+    texts = ["Très bien, merci", "運転手さんは親切でした", "👍 great", ""]
+    body = model_client.encode_request(model_client.OP_ANALYZE, texts)
+    assert model_client.decode_request(body) == (model_client.OP_ANALYZE,
+                                                 texts)
+
+
+def test_request_truncates_long_text_by_characters():
+    text = "é" * (model_client.MAX_TEXT_CHARS + 100)
+    _, (decoded, ) = model_client.decode_request(
+        model_client.encode_request(model_client.OP_ANALYZE, [text]))
+    assert decoded == "é" * model_client.MAX_TEXT_CHARS
+
+
+def test_empty_batch_round_trip():
+    body = model_client.encode_request(model_client.OP_STATS, [])
+    assert model_client.decode_request(body) == (model_client.OP_STATS, [])
+
+
+@pytest.fixture
+def server(tmp_path):
+    """One-connection stub daemon: replies with `reply(op, texts)`."""
+    path = str(tmp_path / "model.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    handler = {}
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn:
+            while True:
+                header = conn.recv(4)
+                if not header:
+                    return
+                (length, ) = struct.unpack(">I", header)
+                body = b""
+                while len(body) < length:
+                    body += conn.recv(length - len(body))
+                reply = handler["reply"](*model_client.decode_request(body))
+                conn.sendall(model_client.frame(reply))
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield path, handler
+    listener.close()
+
+
+def test_analyze_batch_decodes_results(server):
+    path, handler = server
+    handler["reply"] = lambda op, texts: model_client.encode_results(
+        [("POSITIVE" if "great" in t else "NEGATIVE", 0.75) for t in texts])
+    client = ModelClient(path, timeout=5)
+
+    assert client.analyze_batch(["great ride", "rude driver"]) == [
+        ("POSITIVE", 0.75), ("NEGATIVE", 0.75)
+    ]
+    client.close()
+
+
+def test_empty_batch_does_not_call_the_server():
+    assert ModelClient("/nonexistent/model.sock").analyze_batch([]) == []
+
+
+def test_error_status_raises(server):
+    path, handler = server
+    handler["reply"] = lambda op, texts: model_client.encode_error(
+        "Inference failed: out of memory")
+    client = ModelClient(path, timeout=5)
+
+    with pytest.raises(ModelServerError, match="out of memory"):
+        client.analyze_batch(["great ride"])
+    client.close()
+
+
+def test_ai_services_copy_speaks_the_same_protocol(server):
+    path = pathlib.Path(__file__).parents[2] / "ai_services" / "model_client.py"
+    spec = importlib.util.spec_from_file_location("ai_model_client", path)
+    vendored = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(vendored)
+
+    socket_path, handler = server
+    received = []
+
+    def reply(op, texts):
+        received.append((op, texts))
+        return model_client.encode_results([("POSITIVE", 0.5)] * len(texts))
+
+    handler["reply"] = reply
+    client = vendored.ModelClient(socket_path, timeout=5)
+    long_text = "é" * (model_client.MAX_TEXT_CHARS + 1)
+
+    assert client.analyze_batch(["運転手", long_text]) == [("POSITIVE", 0.5)] * 2
+    assert received == [(model_client.OP_ANALYZE,
+                         ["運転手", long_text[:model_client.MAX_TEXT_CHARS]])]
+    client.close()
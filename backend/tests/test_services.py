@@ -0,0 +1,113 @@
+import pytest
+from driver_sentiment_engine import database, models, services
+from driver_sentiment_engine.services import (AlertingService,
+                                              FeedbackProcessor,
+                                              RuleBasedAnalyzer)
+
+
+class FakeStore:
+    """Stands in for the Mongo-backed functions process_batch relies on."""
+
+    def __init__(self):
+        self.marked = set()
+        self.unmarked = []
+        self.stats_updates = []
+        self.saved = []
+        self.fail_stats = False
+        self.fail_save = False
+
+    def check_and_mark_trip(self, trip_id):
+        if trip_id in self.marked:
+            return False
+        self.marked.add(trip_id)
+        return True
+
+    def unmark_trip(self, trip_id):
+        self.marked.discard(trip_id)
+        self.unmarked.append(trip_id)
+
+    def update_stats(self, entity_id, new_score):
+        if self.fail_stats:
+            raise ConnectionError("mongo down")
+        self.stats_updates.append((entity_id, new_score))
+        return {"driver_id": entity_id, "average_score": new_score}
+
+    def save_simple_feedback(self, collection, data):
+        if self.fail_save:
+            raise ConnectionError("mongo down")
+        self.saved.append(data)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(database, "check_and_mark_trip",
+                        store.check_and_mark_trip)
+    monkeypatch.setattr(database, "unmark_trip", store.unmark_trip)
+    monkeypatch.setattr(database, "update_driver_stats", store.update_stats)
+    monkeypatch.setattr(database, "save_simple_feedback",
+                        store.save_simple_feedback)
+    monkeypatch.setattr(services, "publish_admin_event", lambda *args: None)
+    return store
+
+
+def make_processor():
+    return FeedbackProcessor(analyzer=RuleBasedAnalyzer(),
+                             alerter=AlertingService())
+
+
+def submission(trip_id, text="great driver"):
+    return models.GenericFeedbackSubmission(user_id="u",
+                                            entity_type="DRIVER",
+                                            entity_id="D1",
+                                            feedback_text=text,
+                                            trip_id=trip_id)
+
+
+def test_successful_batch_reports_no_failures(store):
+    assert make_processor().process_batch([submission("t1"),
+                                           submission("t2")]) == []
+    assert len(store.stats_updates) == 2
+    assert len(store.saved) == 2
+    assert store.unmarked == []
+
+
+def test_already_processed_trip_is_skipped(store):
+    processor = make_processor()
+    processor.process_batch([submission("t1")])
+    assert processor.process_batch([submission("t1")]) == []
+    assert len(store.stats_updates) == 1
+
+
+def test_failed_submission_is_reported_and_released(store):
+    store.fail_stats = True
+    failures = make_processor().process_batch([submission("t1")])
+
+    assert [s.trip_id for s, _ in failures] == ["t1"]
+    assert store.unmarked == ["t1"]
+    # A redelivery is processed rather than skipped as a duplicate
+    store.fail_stats = False
+    assert make_processor().process_batch([submission("t1")]) == []
+    assert store.stats_updates == [("D1", 5.0)]
+
+
+def test_failure_after_stats_update_is_not_retried(store):
+    store.fail_save = True
+    assert make_processor().process_batch([submission("t1")]) == []
+    assert len(store.stats_updates) == 1
+    assert store.unmarked == []
+
+
+def test_analyzer_failure_releases_every_trip(store):
+
+    class BrokenAnalyzer(RuleBasedAnalyzer):
+
+        def analyze_batch(self, texts):
+            raise ConnectionError("model server down")
+
+    processor = FeedbackProcessor(analyzer=BrokenAnalyzer(),
+                                  alerter=AlertingService())
+    with pytest.raises(ConnectionError):
+        processor.process_batch([submission("t1"), submission("t2")])
+    assert store.unmarked == ["t1", "t2"]
+    assert store.stats_updates == []
@@ -0,0 +1,105 @@
+from driver_sentiment_engine import models
+from driver_sentiment_engine.stream_worker import (StreamConsumer,
+                                                   replay_dead_letters)
+
+STREAM = "feedback_stream"
+
+
+class FakeProcessor:
+    """Fails submissions whose text is "fail"; raises for the whole batch
+    while `outages` is positive."""
+
+    def __init__(self, outages=0):
+        self.outages = outages
+        self.processed = []
+
+    def process_batch(self, submissions):
+        if self.outages:
+            self.outages -= 1
+            raise ConnectionError("model server down")
+        self.processed += [s.feedback_text for s in submissions]
+        return [(s, ValueError("bad")) for s in submissions
+                if s.feedback_text == "fail"]
+
+
+def publish(conn, text):
+    submission = models.GenericFeedbackSubmission(user_id="u",
+                                                  entity_type="DRIVER",
+                                                  entity_id="D1",
+                                                  feedback_text=text)
+    return conn.xadd(STREAM, {"payload": submission.model_dump_json()})
+
+
+def make_consumer(conn, processor, max_deliveries=5):
+    consumer = StreamConsumer(conn,
+                              processor,
+                              stream=STREAM,
+                              consumer="test",
+                              claim_idle_ms=0,
+                              max_deliveries=max_deliveries,
+                              retry_backoff_seconds=0)
+    consumer.ensure_group()
+    return consumer
+
+
+def test_acks_successes_and_malformed_but_not_failures(fake_redis):
+    consumer = make_consumer(fake_redis, FakeProcessor())
+    ok = publish(fake_redis, "great ride")
+    failed = publish(fake_redis, "fail")
+    malformed = fake_redis.xadd(STREAM, {"payload": "not json"})
+
+    assert consumer.handle_batch(consumer._read(None)) == []
+
+    assert list(fake_redis.pending[STREAM]) == [failed]
+    assert ok not in fake_redis.pending[STREAM]
+    assert malformed not in fake_redis.pending[STREAM]
+
+
+def test_batch_wide_failure_is_returned_for_retry(fake_redis):
+    consumer = make_consumer(fake_redis, FakeProcessor(outages=1))
+    ok = publish(fake_redis, "great ride")
+    fake_redis.xadd(STREAM, {"payload": "not json"})
+
+    retry = consumer.handle_batch(consumer._read(None))
+
+    assert [entry_id for entry_id, _ in retry] == [ok]
+    # The malformed entry is done with; the good one is still pending
+    assert fake_redis.pending[STREAM] == {ok: 1}
+
+
+def test_outage_does_not_burn_delivery_attempts(fake_redis):
+    processor = FakeProcessor(outages=10)
+    consumer = make_consumer(fake_redis, processor, max_deliveries=2)
+    publish(fake_redis, "great ride")
+
+    assert consumer.run(burst=True) == 1
+
+    assert processor.processed == ["great ride"]
+    assert fake_redis.pending[STREAM] == {}
+    assert fake_redis.xrange(consumer.dead_letter_stream) == []
+
+
+def test_entry_failing_on_its_own_is_dead_lettered(fake_redis):
+    consumer = make_consumer(fake_redis, FakeProcessor(), max_deliveries=2)
+    entry_id = publish(fake_redis, "fail")
+
+    consumer.handle_batch(consumer._read(None))  # delivery 1
+    consumer.handle_batch(consumer._reclaim())  # delivery 2
+    assert consumer._reclaim() == []  # delivery 3 > 2: given up on
+
+    assert fake_redis.pending[STREAM] == {}
+    dead = fake_redis.xrange(consumer.dead_letter_stream)
+    assert [fields for _, fields in dead] == [
+        dict(fake_redis.xrange(STREAM))[entry_id]
+    ]
+
+
+def test_replay_dead_letters(fake_redis):
+    dead = f"{STREAM}:dead"
+    fake_redis.xadd(dead, {"payload": "a"})
+    fake_redis.xadd(dead, {"payload": "b"})
+
+    assert replay_dead_letters(fake_redis, STREAM, count=1) == 2
+
+    assert fake_redis.xrange(dead) == []
+    assert [f[b"payload"] for _, f in fake_redis.xrange(STREAM)] == [b"a", b"b"]
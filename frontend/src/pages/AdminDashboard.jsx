@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import api from "../services/api";
+import api, { streamAdminEvents } from "../services/api";
 import {
   BarChart,
   Bar,
@@ -13,16 +13,52 @@ import {
 
 import { Paper, Typography, Box, CircularProgress, Alert } from "@mui/material";
 
+const MAX_LIVE_ALERTS = 10;
+
+// Replace the row with the same id, or append it if it is new. A row with a
+// lower feedback_count than the one shown is an older delta and is ignored.
+const upsertStat = (rows, row, idKey) => {
+  const index = rows.findIndex((r) => r[idKey] === row[idKey]);
+  if (index === -1) return [...rows, row];
+  if (rows[index].feedback_count > row.feedback_count) return rows;
+  const next = [...rows];
+  next[index] = row;
+  return next;
+};
+
 export const AdminDashboard = () => {
   const [driverStats, setDriverStats] = useState([]);
   const [marshalStats, setMarshalStats] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [alerts, setAlerts] = useState([]);
 
+  // The live stream is opened first and a snapshot is loaded every time it
+  // (re)connects, so nothing published before or between connections is
+  // missed. Deltas arriving while a snapshot loads are applied on top of it.
   useEffect(() => {
+    const controller = new AbortController();
+    let buffered = null;
+    let loaded = false;
+
+    const applyEvent = ({ kind, data }) => {
+      if (kind === "driver_stats") {
+        setDriverStats((rows) => upsertStat(rows, data, "driver_id"));
+      } else if (kind === "marshal_stats") {
+        setMarshalStats((rows) => upsertStat(rows, data, "marshal_id"));
+      } else if (kind === "alert") {
+        setAlerts((prev) => [data, ...prev].slice(0, MAX_LIVE_ALERTS));
+      }
+    };
+
+    const handleEvent = (event) => {
+      if (buffered) buffered.push(event);
+      else applyEvent(event);
+    };
+
     const fetchAdminData = async () => {
+      buffered = [];
       try {
-        setLoading(true);
         const [driverRes, marshalRes] = await Promise.all([
           api.get("/admin/stats/drivers"),
           api.get("/admin/stats/marshals"),
@@ -35,11 +71,30 @@ export const AdminDashboard = () => {
         console.error("Failed to fetch admin data:", err);
         setError("Could not load admin data.");
       } finally {
+        const pending = buffered;
+        buffered = null;
+        pending.forEach(applyEvent);
+        loaded = true;
         setLoading(false);
       }
     };
 
-    fetchAdminData();
+    const connect = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          await streamAdminEvents(handleEvent, controller.signal, fetchAdminData);
+        } catch (err) {
+          if (controller.signal.aborted) return;
+          console.error("Admin stream disconnected:", err);
+          // Without a live feed, still show the data once
+          if (!loaded) await fetchAdminData();
+        }
+        await new Promise((resolve) => setTimeout(resolve, 3000));
+      }
+    };
+
+    connect();
+    return () => controller.abort();
   }, []);
 
   if (loading) {
@@ -60,6 +115,18 @@ export const AdminDashboard = () => {
         Admin Dashboard
       </Typography>
 
+      {alerts.map((alert) => (
+        <Alert
+          key={`${alert.entity_type}-${alert.entity_id}-${alert.raised_at}`}
+          severity={alert.kind === "ALERT" ? "warning" : "success"}
+          sx={{ mb: 1 }}
+        >
+          {alert.kind === "ALERT"
+            ? `${alert.entity_type} ${alert.entity_id} dropped to ${alert.score.toFixed(2)}`
+            : `${alert.entity_type} ${alert.entity_id} recovered to ${alert.score.toFixed(2)}`}
+        </Alert>
+      ))}
+
       <Typography variant="h6">Driver Average Scores</Typography>
       <ChartComponent
         data={driverStats}
@@ -24,4 +24,43 @@ api.interceptors.request.use(config => {
   return Promise.reject(error);
 });
 
+// 3. LIVE ADMIN FEED
+// EventSource cannot send an Authorization header, so the SSE stream is read
+// with fetch and parsed by hand. Calls onOpen() once the server has
+// subscribed (so a snapshot fetched from there misses nothing), then
+// onEvent({ kind, data }) per message. Resolves when the stream ends or
+// `signal` aborts.
+export const streamAdminEvents = async (onEvent, signal, onOpen) => {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${api.defaults.baseURL}/admin/stream`, {
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+    signal,
+  });
+  if (!response.ok) {
+    throw new Error(`Admin stream failed: ${response.status}`);
+  }
+  if (onOpen) onOpen();
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += value;
+
+    // SSE messages are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const data = message
+        .split('\n')
+        .filter(line => line.startsWith('data: '))
+        .map(line => line.slice(6))
+        .join('\n');
+      if (data) onEvent(JSON.parse(data));
+    }
+  }
+};
+
 export default api;
\ No newline at end of file